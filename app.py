@@ -1,19 +1,41 @@
 # ----------------------------- IMPORTS -----------------------------
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, File, UploadFile, Query, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field  # Add the missing import here
+from pydantic import BaseModel, Field, StrictBool  # Add the missing import here
 import os
 import httpx
 import joblib
 import pandas as pd
 import numpy as np
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 import requests
 import re
-from google import genai
+import json
+import hmac
+import itertools
+import functools
+import copy
+import asyncio
+import time
+import threading
+import bisect
+import sys
+import weakref
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Union
 
 # ----------------------------- FASTAPI APP INITIALIZATION -----------------------------
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Optionally load every model in the background so the first requests don't pay for it
+    if MODEL_WARMUP:
+        model_registry.warm_up()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 # ----------------------------- CORS SETUP -----------------------------
 # Allow frontend to call the backend without CORS issues
@@ -33,33 +55,531 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# ----------------------------- INSTRUMENTATION -----------------------------
+# Handlers mark hot-path stages with `with stage("model"):`. The middleware records each
+# stage's per-request total as a Prometheus histogram (GET /metrics), counts payload sizes and
+# statuses, and echoes the stages finished before the response starts in a Server-Timing
+# header (streamed responses only get theirs in the histograms). With PROFILING_ENABLED=1, a request
+# sent with `?profile=1` (or `X-Profile: 1`) is sampled by a stack profiler.
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+PROFILE_HISTORY = int(os.environ.get("PROFILE_HISTORY", 20))
+
+latency_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+size_buckets = (100, 1000, 10000, 100000, 1000000, 10000000, 100000000)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+class Metrics:
+    # Minimal Prometheus registry; labels are tuples of (name, value) pairs
+    def __init__(self):
+        self._lock = threading.Lock()  # bulk scoring records stages from worker threads
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name: str, labels: tuple, value: float, buckets=latency_buckets):
+        with self._lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        with self._lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in self.counters.items():
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in self.histograms.items():
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels((*labels, ('le', bound)))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class RequestTimings:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last_mark = None  # end of the latest stage; None until the handler starts
+        self.stages = []  # (stage, seconds), in the order they finished
+
+    def add(self, name: str, seconds: float):
+        self.stages.append((name, seconds))
+        self.last_mark = time.perf_counter()
+
+    def totals(self) -> dict:
+        # Per-request time in each stage; streamed routes repeat a stage once per chunk
+        totals = {}
+        for name, seconds in self.stages:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def server_timing(self) -> str:
+        totals = self.totals()
+        totals["total"] = time.perf_counter() - self.start
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in totals.items())
+
+
+request_timings: ContextVar[Optional["RequestTimings"]] = ContextVar("request_timings", default=None)
+
+
+def handler_started():
+    # Everything before the handler body: routing, reading the body and pydantic validation
+    timings = request_timings.get()
+    if timings is not None:
+        timings.add("validation", time.perf_counter() - timings.start)
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = request_timings.get()
+        if timings is not None:
+            timings.add(name, time.perf_counter() - start)
+
+
+def record_model_error(model: str):
+    metrics.inc("model_errors_total", (("model", model),))
+
+
+class SamplingProfiler:
+    # Samples every thread's stack at a fixed interval and keeps them as collapsed stacks
+    # ("thread;outer;...;inner count"), the input format of flamegraph tools. Other requests
+    # running at the same time show up too.
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                # Skip this thread and threads parked waiting for work
+                if thread_id == own_id or os.path.basename(frame.f_code.co_filename) in ("threading.py", "selectors.py", "queue.py"):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join([names.get(thread_id, str(thread_id)), *reversed(stack)])] += 1
+
+
+# Swap in another profiler with the same start()/stop() -> str interface if needed
+profiler_factory = SamplingProfiler
+recent_profiles = OrderedDict()
+profile_ids = itertools.count(1)
+
+
+def _profile_requested(scope) -> bool:
+    if b"profile=1" in scope.get("query_string", b"").split(b"&"):
+        return True
+    return any(key == b"x-profile" and value == b"1" for key, value in scope.get("headers", []))
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = request_timings.set(timings)
+        request_bytes = 0
+        response_bytes = 0
+        status = 500
+
+        profiler = None
+        if PROFILING_ENABLED and _profile_requested(scope):
+            profile_id = str(next(profile_ids))
+            profiler = profiler_factory(PROFILE_INTERVAL_MS / 1000)
+            profiler.start()
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def timing_send(message):
+            nonlocal response_bytes, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings.last_mark is not None:
+                    # Time from the last stage to the response: building and encoding it
+                    timings.add("serialization", time.perf_counter() - timings.last_mark)
+                headers = [*message.get("headers", []), (b"server-timing", timings.server_timing().encode())]
+                if profiler is not None:
+                    headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, timing_send)
+        finally:
+            request_timings.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")  # route templates keep label cardinality low
+            metrics.observe("http_request_duration_seconds", (("route", route),), time.perf_counter() - timings.start)
+            metrics.inc("http_requests_total", (("route", route), ("method", scope["method"]), ("status", str(status))))
+            metrics.observe("http_request_size_bytes", (("route", route),), request_bytes, size_buckets)
+            metrics.observe("http_response_size_bytes", (("route", route),), response_bytes, size_buckets)
+            for name, seconds in timings.totals().items():
+                metrics.observe("http_stage_duration_seconds", (("route", route), ("stage", name)), seconds)
+
+            if profiler is not None:
+                recent_profiles[profile_id] = profiler.stop()
+                while len(recent_profiles) > PROFILE_HISTORY:
+                    recent_profiles.popitem(last=False)
+
+
+app.add_middleware(InstrumentationMiddleware)
+
 # ----------------------------- MODEL LOADING -----------------------------
-# Load Crop Prediction Model
-
-crop_model_path = os.path.join('model', 'Crop_prediction.pkl')
-try:
-    crop_model = joblib.load(crop_model_path)
-except Exception as e:
-    print(f"Error loading crop prediction model: {e}")
-    crop_model = None
-
-# Load Price Estimation Model
-price_model_path = "model/crop_price_model.pkl"
-try:
-    price_model = joblib.load(price_model_path)
-except Exception as e:
-    print(f"Error loading price estimation model: {e}")
-    price_model = None
-
-# Load yeild Prediction Model
-yield_model_path = "model/yield_prediction_model.pkl"
-try:
-    yield_model = joblib.load(yield_model_path)
-except Exception as e:
-    print(f"Error loading crop prediction model: {e}")
-    yeild_model = None
+# Models are loaded on first use (or by the optional background warm-up) through the registry,
+# and a model file that changes on disk (new inode, mtime or size) is picked up without a restart.
+# MODEL_MMAP_MODE=r maps large numpy arrays (not the sklearn tree nodes) from the file instead of
+# copying them. A mapped model reads the file for as long as it is in use, so with mmap enabled
+# new models must be swapped in with an atomic rename (os.replace), never overwritten in place.
+
+MODEL_DIR = os.environ.get("MODEL_DIR", "model")
+MODEL_MMAP_MODE = os.environ.get("MODEL_MMAP_MODE") or None  # off by default
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "0") == "1"
+MODEL_WATCH_INTERVAL_S = float(os.environ.get("MODEL_WATCH_INTERVAL_S", 30))  # 0 disables the file check
+
+
+def _model_bytes(model) -> int:
+    # Bytes held in the numpy arrays and raw buffers reachable from a fitted model, each counted
+    # once (sklearn trees expose their node arrays through __getstate__). Python object overhead
+    # is not included.
+    total = 0
+    seen = {}  # id -> object; keeps temporaries from __getstate__ alive so ids aren't reused
+    stack = [model]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (str, int, float, type(None), type, np.generic)):
+            continue
+        seen[id(item)] = item
+        if isinstance(item, np.ndarray):
+            total += item.nbytes
+            if item.dtype == object:
+                stack.extend(item.ravel())
+        elif isinstance(item, (bytes, bytearray)):
+            total += len(item)  # e.g. a serialized booster
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        else:
+            try:
+                state = item.__getstate__()
+            except Exception:
+                state = getattr(item, "__dict__", None)
+            if isinstance(state, dict):
+                stack.extend(state.values())
+            elif isinstance(state, (list, tuple)):
+                stack.extend(state)
+    return total
+
+
+class LazyModel:
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.model = None
+        self.error = None
+        self.version = 0  # bumped on every successful (re)load
+        self.signature = None  # (inode, mtime, size) of the file that was loaded
+        self.load_time_s = None
+        self.model_bytes = None
+        self.file_bytes = None
+        self._attempted = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _check_due(self) -> bool:
+        return MODEL_WATCH_INTERVAL_S > 0 and time.monotonic() - self._checked_at > MODEL_WATCH_INTERVAL_S
+
+    def get(self):
+        if not self._attempted:
+            self.load(force=False)
+        elif self._check_due():
+            self.reload_if_changed()
+        return self.model
+
+    async def aget(self):
+        # Same as get(), but any (re)load runs on a worker thread instead of the event loop
+        if self._attempted and not self._check_due():
+            return self.model
+        return await asyncio.to_thread(self.get)
+
+    def load(self, force: bool = True):
+        with self._lock:
+            if self._attempted and not force:
+                return self.model
+
+            self._checked_at = time.monotonic()
+            self.signature = self._file_signature()
+
+            start = time.perf_counter()
+            try:
+                model = joblib.load(self.path, mmap_mode=MODEL_MMAP_MODE)
+            except Exception as e:
+                # A failed reload keeps serving the previous model
+                print(f"Error loading {self.name} model: {e}")
+                metrics.inc("model_load_errors_total", (("model", self.name),))
+                self.error = str(e)
+            else:
+                self.load_time_s = time.perf_counter() - start
+                self.model_bytes = _model_bytes(model)
+                self.file_bytes = None if self.signature is None else self.signature[2]
+                self.model = model
+                self.error = None
+                self.version += 1
+            self._attempted = True
+            return self.model
+
+    def _file_signature(self):
+        # A rename changes the inode even when the mtime is preserved (e.g. cp -p, rsync -t)
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def reload_if_changed(self):
+        self._checked_at = time.monotonic()
+        signature = self._file_signature()
+        if signature is not None and signature != self.signature:
+            self.load()
+        return self.model
+
+    def stats(self) -> dict:
+        # No file path or exception text: these are served on a public route
+        return {
+            "loaded": self.model is not None,
+            "version": self.version,
+            "load_time_s": self.load_time_s,
+            "model_bytes": self.model_bytes,
+            "file_bytes": self.file_bytes,
+            "load_failed": self.error is not None,
+        }
+
+
+class ModelRegistry:
+    def __init__(self):
+        self.models = {}
+
+    def register(self, name: str, path: str):
+        self.models[name] = LazyModel(name, path)
+
+    def get(self, name: str):
+        return self.models[name].get()
+
+    async def aget(self, name: str):
+        return await self.models[name].aget()
+
+    def version(self, name: str) -> int:
+        return self.models[name].version
+
+    def reload(self, name: str):
+        return self.models[name].load()
+
+    def warm_up(self):
+        def load_all():
+            for model in self.models.values():
+                model.get()
+
+        threading.Thread(target=load_all, name="model-warmup", daemon=True).start()
+
+    def stats(self) -> dict:
+        return {name: model.stats() for name, model in self.models.items()}
+
+
+model_registry = ModelRegistry()
+model_registry.register("crop", os.path.join(MODEL_DIR, "Crop_prediction.pkl"))  # Crop Prediction Model
+model_registry.register("price", os.path.join(MODEL_DIR, "crop_price_model.pkl"))  # Price Estimation Model
+model_registry.register("yield", os.path.join(MODEL_DIR, "yield_prediction_model.pkl"))  # Yield Prediction Model
+
+# ----------------------------- MICRO-BATCHING -----------------------------
+# Single-row requests arriving within a short window are grouped into one predict call
+# that runs on a worker thread, so the event loop is never blocked by model inference.
+
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 64))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 5))
+
+
+class MicroBatcher:
+    def __init__(self, predict_batch, max_batch_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS,
+                 name: str = "model"):
+        self.predict_batch = predict_batch  # list of rows -> sequence of results
+        self.name = name  # model label for error metrics
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def predict(self, row):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)  # keep a reference until the batch is done
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            results = await asyncio.to_thread(self.predict_batch, [row for row, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                # Retry row by row so one bad input doesn't fail every caller in the batch
+                await asyncio.gather(*(self._run([item]) for item in batch))
+                return
+            record_model_error(self.name)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():  # skip callers that went away
+                future.set_result(result)
+
+
+def _predict_crop_batch(rows):
+    return crop_engine.predict(model_registry.get("crop"), rows)
+
+
+def _predict_crop_proba_batch(rows):
+    probabilities, classes = crop_engine.predict_proba(model_registry.get("crop"), rows)
+    return [(row, classes) for row in probabilities]
+
+
+def _predict_price_batch(rows):
+    return model_registry.get("price").predict(np.array(rows))
+
+
+def _predict_yield_batch(rows):
+    return model_registry.get("yield").predict(np.array(rows, dtype=float))
+
+
+crop_batcher = MicroBatcher(_predict_crop_batch, name="crop")
+crop_proba_batcher = MicroBatcher(_predict_crop_proba_batch, name="crop")
+price_batcher = MicroBatcher(_predict_price_batch, name="price")
+yield_batcher = MicroBatcher(_predict_yield_batch, name="yield")
+
+# ----------------------------- CACHING -----------------------------
+# In-process caches for answers and predictions that are cheap to keep and slow to recompute
+
+class TTLCache:
+    # LRU cache whose entries also expire after ttl seconds; only used from the event loop thread
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is not None:
+            expires_at, value = item
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
 
 # ----------------------------- INPUT SCHEMAS -----------------------------
+# A categorical field is a name or an index. StrictBool comes first so JSON true/false reaches
+# Vocabulary.lookup as a bool (rejected with a 400) instead of being read as index 1/0.
+CategoryValue = Union[StrictBool, int, str]
+
 # Request schema for Crop Prediction API
 
 class CropPredictionInput(BaseModel):
@@ -71,19 +591,56 @@ class CropPredictionInput(BaseModel):
     rainfall: float = Field(..., ge=0, le=300)
     temperature: float = Field(..., ge=0, le=50)
 
-# Price Estimation Input Schema
+# Price Estimation Input Schema (each field is a name or an index, month index is 1-based)
 class PriceEstimationRequest(BaseModel):
-    district: int
-    month: int
-    market: int
-    commodity: int
-    variety: int
-    agri_season: int
-    climate_season: int
+    district: CategoryValue
+    month: CategoryValue
+    market: CategoryValue
+    commodity: CategoryValue
+    variety: CategoryValue
+    agri_season: CategoryValue
+    climate_season: CategoryValue
 
 # ----------------------------- STATIC MAPPINGS -----------------------------
 # These lists will be used to map human-readable names to index values for model input
 
+# CropPredictionInput field -> column the crop model was trained with, in the model's column order.
+# Rows are built by name from this mapping (the original handler passed the fields by position,
+# which fed ph, rainfall and temperature into the temperature, pH and rainfall columns)
+crop_feature_columns = {
+    "nitrogen": "N",
+    "phosphorus": "P",
+    "potassium": "K",
+    "temperature": "temperature",
+    "humidity": "humidity",
+    "ph": "pH",
+    "rainfall": "rainfall",
+}
+crop_model_columns = list(crop_feature_columns.values())
+
+
+def field_bounds(schema) -> dict:
+    # field -> (ge, le) read from the schema's Field(...) constraints, in field order
+    bounds = {}
+    for name, field in schema.model_fields.items():
+        limits = {key: getattr(item, key) for item in field.metadata for key in ("ge", "le") if hasattr(item, key)}
+        bounds[name] = (limits.get("ge"), limits.get("le"))
+    return bounds
+
+
+# CropPredictionInput fields (in order) and their bounds, shared with the bulk scorer
+crop_input_bounds = field_bounds(CropPredictionInput)
+
+# Crop model output label -> crop name
+crop_labels = np.array([
+    'aloevera', 'blackpepper', 'chilli', 'garlic', 'ginger', 'groundnut', 'onion',
+    'potato', 'soybean', 'sugarcane', 'sunflower', 'tea', 'tobacco', 'tomato',
+    'turmeric', 'wheat', 'apple', 'banana', 'blackgram', 'chickpea', 'coconut',
+    'coffee', 'cotton', 'grapes', 'jute', 'kidneybeans', 'lentil', 'maize',
+    'mango', 'mothbeans', 'mungbean', 'muskmelon', 'orange', 'papaya', 'pigeonpeas',
+    'pomegranate', 'rice', 'watermelon'
+], dtype=object)
+
 districts =['Ahmednagar', 'Akola', 'Amarawati', 'Beed', 'Bhandara', 'Buldhana', 'Chandrapur', 'Chattrapati Sambhajinagar', 'Dharashiv(Usmanabad)', 'Dhule', 'Gadchiroli', 'Hingoli', 'Jalana', 'Jalgaon', 'Kolhapur', 'Latur', 'Mumbai', 'Nagpur', 'Nanded', 'Nandurbar', 'Nashik', 'Parbhani', 'Pune', 'Raigad', 'Ratnagiri', 'Sangli', 'Satara', 'Sholapur', 'Thane', 'Vashim', 'Wardha', 'Yavatmal']
 months = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
 markets =['ACF Agro Marketing', 'Aarni', 'Aatpadi', 'Achalpur', 'Aheri', 'Ahmednagar', 'Ahmedpur', 'Akhadabalapur', 'Akkalkot', 'Akkalkuwa', 'Akluj', 'Akola', 'Akole', 'Akot', 'Alibagh', 'Amalner', 'Amarawati', 'Ambad (Vadigodri)', 'Ambejaogai', 'Amrawati(Frui & Veg. Market)', 'Anajngaon', 'Armori(Desaiganj)', 'Arvi', 'Ashti', 'Ashti(Jalna)', 'Ashti(Karanja)', 'Aurad Shahajani', 'Ausa', 'BSK Krishi Bazar Private Ltd', 'Babhulgaon', 'Balapur', 'Baramati', 'Barshi', 'Barshi Takli', 'Barshi(Vairag)', 'Basmat', 'Basmat(Kurunda)', 'Beed', 'Bhadrawati', 'Bhagyoday Cotton and Agri Market', 'Bhandara', 'Bhivandi', 'Bhiwapur', 'Bhokar', 'Bhokardan', 'Bhokardan(Pimpalgaon Renu)', 'Bhusaval', 'Bodwad', 'Bori', 'Bori Arab', 'Buldhana', 'Buldhana(Dhad)', 'Chakur', 'Chalisgaon', 'Chandrapur', 'Chandrapur(Ganjwad)', 'Chandur Bazar', 'Chandur Railway', 'Chandvad', 'Chattrapati Sambhajinagar', 'Chikali', 'Chimur', 'Chopada', 'Cottoncity Agro Foods Private Ltd', 'Darwha', 'Daryapur', 'Deglur', 'Deoulgaon Raja', 'Deulgaon Raja Balaji Agro Marketing Private Market', 'Devala', 'Devani', 'Dhadgaon', 'Dhamngaon-Railway', 'Dharangaon', 'Dharashiv', 'Dharmabad', 'Dharni', 'Dhule', 'Digras', 'Dindori', 'Dindori(Vani)', 'Dondaicha', 'Dondaicha(Sindhkheda)', 'Dound', 'Dudhani', 'Fulmbri', 'Gadhinglaj', 'Gajanan Krushi Utpanna Bazar (India) Pvt Ltd', 'Gangakhed', 'Gangapur', 'Gevrai', 'Ghansawangi', 'Ghatanji', 'Ghoti', 'Gondpimpri', 'Gopal Krishna Agro', 'Hadgaon', 'Hadgaon(Tamsa)', 'Hari Har Khajagi Bazar Parisar', 'Higanghat Infrastructure Private Limited', 'Himalyatnagar', 'Hinganghat', 'Hingna', 'Hingoli', 'Hingoli(Kanegoan Naka)', 'Indapur', 'Indapur(Bhigwan)', 'Indapur(Nimgaon Ketki)', 'Islampur', 'J S K Agro Market', 'Jafrabad', 'Jagdamba Agrocare', 'Jai Gajanan Krishi Bazar', 'Jalana', 'Jalgaon', 'Jalgaon Jamod(Aasalgaon)', 'Jalgaon(Masawat)', 'Jalkot', 'Jalna(Badnapur)', 'Jamkhed', 'Jamner', 'Jamner(Neri)', 'Janata Agri Market (DLS Agro Infrastructure Pvt Lt', 'Jawala-Bajar', 'Jawali', 'Jaykissan Krushi Uttpan Khajgi Bazar', 'Jintur', 'Junnar', 'Junnar(Alephata)', 'Junnar(Narayangaon)', 'Junnar(Otur)', 'Kada', 'Kada(Ashti)', 'Kai Madhavrao Pawar Khajgi Krushi Utappan Bazar Sa', 'Kaij', 'Kalamb', 'Kalamb (Dharashiv)', 'Kalamnuri', 'Kalmeshwar', 'Kalvan', 'Kalyan', 'Kamthi', 'Kandhar', 'Kannad', 'Karad', 'Karanja', 'Karjat', 'Karjat(Raigad)', 'Karmala', 'Katol', 'Khamgaon', 'Khed', 'Khed(Chakan)', 'Khultabad', 'Kille Dharur', 'Kinwat', 'Kisan Market Yard', 'Kolhapur', 'Kolhapur(Malkapur)', 'Kopargaon', 'Koregaon', 'Korpana', 'Krushna Krishi Bazar', 'Kurdwadi', 'Kurdwadi(Modnimb)', 'Lakhandur', 'Lasalgaon', 'Lasalgaon(Niphad)', 'Lasalgaon(Vinchur)', 'Lasur Station', 'Late Vasantraoji Dandale Khajgi Krushi Bazar', 'Latur', 'Latur(Murud)', 'Laxmi Sopan Agriculture Produce Marketing Co Ltd', 'Loha', 'Lonand', 'Lonar', 'MS Kalpana Agri Commodities Marketing', 'Mahagaon', 'Maharaja Agresen Private Krushi Utappan Bazar Sama', 'Mahavir Agri Market', 'Mahavira Agricare', 'Mahesh Krushi Utpanna Bazar, Digras', 'Mahur', 'Majalgaon', 'Malegaon', 'Malegaon(Vashim)', 'Malharshree Farmers Producer Co Ltd', 'Malkapur', 'Manchar', 'Mandhal', 'Mangal Wedha', 'Mangaon', 'Mangrulpeer', 'Mankamneshwar Farmar Producer CoLtd Sanchalit Mank', 'Manmad', 'Manora', 'Mantha', 'Manwat', 'Marathawada Shetkari Khajgi Bazar Parisar', 'Maregoan', 'Mauda', 'Mehekar', 'Mohol', 'Morshi', 'Motala', 'Mudkhed', 'Mukhed', 'Mulshi', 'Mumbai', 'Mumbai- Fruit Market', 'Murbad', 'Murtizapur', 'Murud', 'Murum', 'N N Mundhada Agriculture Market Produce', 'Nagpur', 'Naigaon', 'Nampur', 'Nanded', 'Nandgaon', 'Nandgaon Khandeshwar', 'Nandura', 'Nandurbar', 'Narkhed', 'Nashik(Devlali)', 'Nasik', 'Navapur', 'Ner Parasopant', 'Newasa', 'Newasa(Ghodegaon)', 'Nilanga', 'Nira', 'Nira(Saswad)', 'Om Chaitanya Multistate Agro Purpose CoOp Society', 'Pachora', 'Pachora(Bhadgaon)', 'Paithan', 'Palam', 'Palghar', 'Palus', 'Pandhakawada', 'Pandharpur', 'Panvel', 'Parali Vaijyanath', 'Paranda', 'Parbhani', 'Parner', 'Parola', 'Parshiwani', 'Partur', 'Partur(Vatur)', 'Patan', 'Pathardi', 'Pathari', 'Patoda', 'Patur', 'Pavani', 'Pen', 'Perfect Krishi Market Yard Pvt Ltd', 'Phaltan', 'Pimpalgaon', 'Pimpalgaon Baswant(Saykheda)', 'Pombhurni', 'Pratap Nana Mahale Khajgi Bajar Samiti', 'Premium Krushi Utpanna Bazar', 'Pulgaon', 'Pune', 'Pune(Khadiki)', 'Pune(Manjri)', 'Pune(Moshi)', 'Pune(Pimpri)', 'Purna', 'Pusad', 'Rahata', 'Rahuri', 'Rahuri(Songaon)', 'Rahuri(Vambori)', 'Rajura', 'Ralegaon', 'Ramdev Krushi Bazaar', 'Ramtek', 'Rangrao Patil Krushi Utpanna Khajgi Bazar', 'Ratnagiri (Nachane)', 'Raver', 'Raver(Sauda)', 'Risod', 'Sakri', 'Samudrapur', 'Sangamner', 'Sangli', 'Sangli(Phale, Bhajipura Market)', 'Sangola', 'Sangrampur(Varvatbakal)', 'Sant Namdev Krushi Bazar,', 'Satana', 'Satara', 'Savner', 'Selu', 'Sengoan', 'Shahada', 'Shahapur', 'Shantilal Jain Agro', 'Shegaon', 'Shekari Krushi Khajgi Bazar', 'Shetkari Khajgi Bajar', 'Shetkari Khushi Bazar', 'Shevgaon', 'Shevgaon(Bodhegaon)', 'Shirpur', 'Shirur', 'Shivsiddha Govind Producer Company Limited Sanchal', 'Shree Rameshwar Krushi Market', 'Shree Sairaj Krushi Market', 'Shree Salasar Krushi Bazar', 'Shri Gajanan Maharaj Khajagi Krushi Utpanna Bazar', 'Shrigonda', 'Shrigonda(Gogargaon)', 'Shrirampur', 'Shrirampur(Belapur)', 'Sillod', 'Sillod(Bharadi)', 'Sindi', 'Sindi(Selu)', 'Sindkhed Raja', 'Sinner', 'Sironcha', 'Solapur', 'Sonpeth', 'Suragana', 'Tadkalas', 'Taloda', 'Tasgaon', 'Telhara', 'Tiwasa', 'Tuljapur', 'Tumsar', 'Udgir', 'Ulhasnagar', 'Umared', 'Umarga', 'Umari', 'Umarked(Danki)', 'Umarkhed', 'Umrane', 'Vadgaonpeth', 'Vaduj', 'Vadvani', 'Vai', 'Vaijpur', 'Vani', 'Varora', 'Varud', 'Varud(Rajura Bazar)', 'Vasai', 'Vashi New Mumbai', 'Vita', 'Vitthal Krushi Utpanna Bazar', 'Wardha', 'Washi (Dharashiv)', 'Washim', 'Washim(Ansing)', 'Yashika Agro Marketing', 'Yawal', 'Yeola', 'Yeotmal', 'ZariZamini']
@@ -98,14 +655,215 @@ Districtss = ['Ahmednagar', 'Akola', 'Amravati', 'Aurangabad', 'Beed', 'Bhandara
 commoditiess =['Ajwain (Carom Seeds)', 'Aloe Vera', 'Arecanut (Betelnut)', 'Arhar/tur', 'Ashwagandha', 'Bajra', 'Bajra (Pearl Millet)', 'Banana', 'Barley', 'Ber (Indian Jujube)', 'Berseem', 'Bitter Gourd', 'Black Pepper', 'Bottle Gourd', 'Brinjal (Eggplant)', 'Cabbage', 'Carrot', 'Cashew Nut', 'Castor Seed', 'Castor seed', 'Cauliflower', 'Chana (Bengal Gram)', 'Chikoo (Sapota)', 'Chilli', 'Cluster Beans (Gavar)', 'Coconut', 'Coffee', 'Coriander', 'Coriander Seeds', 'Cotton', 'Cotton(lint)', 'Cucumber', 'Cumin (Jeera)', 'Custard Apple', 'Dill Seeds', 'Drumstick', 'Fennel (Saunf)', 'Fenugreek (Methi)', 'Fig (Anjeer)', 'French Beans', 'Garlic', 'Ginger', 'Gram', 'Grapes', 'Green Peas', 'Groundnut', 'Guava', 'Hybrid Napier Grass', 'Jackfruit', 'Jamun', 'Jowar', 'Jowar (Sorghum)', 'Kulthi (Horse Gram)', 'Lady Finger (Bhindi)', 'Lemon', 'Lemongrass', 'Linseed', 'Lobia (Cowpea)', 'Lucerne', 'Maize', 'Maize (For Fodder)', 'Mango', 'Masoor (Lentil)', 'Moong (Green Gram)', 'Moong(green gram)', 'Muskmelon', 'Mustard', 'Mustard Seeds', 'Neem', 'Niger (Ramtil)', 'Niger seed', 'Onion', 'Orange', 'Papaya', 'Pineapple', 'Pomegranate', 'Potato', 'Pumpkin', 'Radish', 'Ragi', 'Ragi (Finger Millet)', 'Rajma (Kidney Beans)', 'Rapeseed & Mustard', 'Rice', 'Safflower', 'Safflower (Kardi)', 'Sarpagandha', 'Sesame (Til)', 'Sesamum', 'Sorghum (For Fodder)', 'Soyabean', 'Soybean', 'Spinach', 'Sugarcane', 'Sunflower', 'Sweet Lime (Mosambi)', 'Tea', 'Tobacco', 'Tomato', 'Tulsi (Holy Basil)', 'Tur (Arhar/Red Gram)', 'Turmeric', 'Urad', 'Urad (Black Gram)', 'Watermelon', 'Wheat'] # Example commodities
 seasonss =['Kharif', 'Rabi', 'Summer', 'Whole Year']  # Example seasons
 
+# ----------------------------- CROP INFERENCE -----------------------------
+# Feeds float32 numpy rows straight to the model instead of building a one-row DataFrame
+# per request. sklearn warns on every array call to a model fitted on a DataFrame, so when
+# the fitted columns are exactly crop_model_columns the array goes to a shallow copy without
+# the stored names. Any other model (other columns, pipelines, wrappers whose names can't be
+# dropped) gets a DataFrame and sklearn's usual feature-name checks.
+
+
+def crop_names(labels) -> np.ndarray:
+    labels = np.asarray(labels)
+    names = np.full(labels.shape, "Unknown Crop", dtype=object)
+    if labels.dtype.kind in "iuf":
+        known = (labels >= 0) & (labels < len(crop_labels)) & (labels % 1 == 0)
+        names[known] = crop_labels[labels[known].astype(np.int64)]
+    return names
+
+
+class CropInferenceEngine:
+    def __init__(self):
+        self._local = threading.local()  # batches run on several worker threads at once
+        self._array_models = weakref.WeakKeyDictionary()  # model -> array-safe copy, or None for DataFrames
+
+    def features(self, rows) -> np.ndarray:
+        if isinstance(rows, np.ndarray):
+            return rows.astype(np.float32, copy=False)
+
+        # Reuse this thread's buffer; trees work in float32, so the model won't copy it again
+        n = len(rows)
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or len(buffer) < n:
+            buffer = self._local.buffer = np.empty((max(n, BATCH_MAX_SIZE), len(crop_model_columns)), dtype=np.float32)
+        buffer[:n] = rows
+        return buffer[:n]
+
+    def _array_model(self, model):
+        if model not in self._array_models:
+            names = getattr(model, "feature_names_in_", None)
+            if names is None:
+                self._array_models[model] = model  # fitted on arrays
+            elif list(names) != crop_model_columns:
+                self._array_models[model] = None
+            else:
+                array_model = copy.copy(model)  # shares the fitted trees
+                try:
+                    del array_model.feature_names_in_
+                except AttributeError:
+                    array_model = None  # read-only property (Pipeline, xgboost)
+                self._array_models[model] = array_model
+        return self._array_models[model]
+
+    def _call(self, model, method: str, rows):
+        features = self.features(rows)
+        array_model = self._array_model(model)
+        if array_model is None:
+            return getattr(model, method)(pd.DataFrame(features, columns=crop_model_columns))
+        return getattr(array_model, method)(features)
+
+    def predict(self, model, rows) -> np.ndarray:
+        return crop_names(self._call(model, "predict", rows))
+
+    def predict_proba(self, model, rows):
+        # Returns (probabilities, crop name for each probability column)
+        if not hasattr(model, "predict_proba"):
+            raise ValueError("Crop model does not provide probabilities")
+        return self._call(model, "predict_proba", rows), crop_names(model.classes_)
+
+    def top_k(self, probabilities: np.ndarray, classes: np.ndarray, k: int) -> list:
+        order = np.argsort(-probabilities, kind="stable")[:k]  # ties keep predict()'s order
+        return [{"crop": classes[i], "probability": float(probabilities[i])} for i in order]
+
+
+crop_engine = CropInferenceEngine()
+
+# ----------------------------- VOCABULARIES -----------------------------
+# Built once at startup: dict lookups replace `x in list` / `list.index`, and every
+# categorical field accepts either its name (case/whitespace-insensitive) or its index.
+
+def normalize_name(value) -> str:
+    return " ".join(str(value).split()).casefold()
+
+
+class Vocabulary:
+    def __init__(self, field: str, names, first_index: int = 0):
+        self.field = field
+        self.names = list(names)
+        self.first_index = first_index  # index clients use for names[0] (months are 1-based)
+        self.index = {}
+        self.aliases = {}
+        for i, name in enumerate(self.names):
+            # Exact names win; near-duplicates like 'Latur'/'latur' keep their own codes
+            self.index.setdefault(name, i)
+            self.aliases.setdefault(normalize_name(name), i)
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, value):
+        # Model code for a name or client index, or None if it is unknown
+        if isinstance(value, (bool, np.bool_)):
+            return None  # bool is an int subclass; True must not mean index 1
+        if isinstance(value, str):
+            code = self.index.get(value)
+            if code is None:
+                code = self.aliases.get(normalize_name(value))
+            if code is not None or not value.strip().lstrip("-").isdigit():
+                return code
+            value = int(value)
+        if isinstance(value, (float, np.floating)) and float(value).is_integer():
+            value = int(value)  # CSV columns with blanks are read as floats
+        if isinstance(value, (int, np.integer)) and 0 <= value - self.first_index < len(self.names):
+            return int(value) - self.first_index
+        return None
+
+    def encode(self, value) -> int:
+        code = self.lookup(value)
+        if code is None:
+            raise HTTPException(status_code=400, detail=f"Invalid {self.field}: {value!r}")
+        return code
+
+    def encode_column(self, column: pd.Series) -> np.ndarray:
+        # Looks up each distinct value once; unknown values come back as NaN
+        codes, uniques = pd.factorize(column)
+        unique_codes = np.array([np.nan if code is None else code for code in map(self.lookup, uniques)] + [np.nan])
+        return unique_codes[codes]  # factorize marks missing values as -1, which picks the trailing NaN
+
+
+price_vocabularies = {
+    "district": Vocabulary("district", districts),
+    "month": Vocabulary("month", months, first_index=1),
+    "market": Vocabulary("market", markets),
+    "commodity": Vocabulary("commodity", commodities),
+    "variety": Vocabulary("variety", varieties),
+    "agri_season": Vocabulary("agri_season", agri_seasons),
+    "climate_season": Vocabulary("climate_season", climate_seasons),
+}
+
+yield_vocabularies = {
+    "state": Vocabulary("state", statess),
+    "district": Vocabulary("district", Districtss),
+    "commodity": Vocabulary("commodity", commoditiess),
+    "season": Vocabulary("season", seasonss),
+}
+
+# Yield commodity -> price commodity, for ranking crops by expected revenue. Names that
+# match after normalization (or before any "(...)" suffix) are joined automatically;
+# these are the spellings that differ between the two lists.
+yield_to_price_commodity_names = {
+    'Arhar/tur': 'Arhar (Tur/Red Gram)(Whole)',
+    'Tur (Arhar/Red Gram)': 'Arhar (Tur/Red Gram)(Whole)',
+    'Cashew Nut': 'Cashewnuts',
+    'Chana (Bengal Gram)': 'Bengal Gram(Gram)(Whole)',
+    'Gram': 'Bengal Gram(Gram)(Whole)',
+    'Chikoo (Sapota)': 'Chikoos(Sapota)',
+    'Chilli': 'Chili Red',
+    'Coriander Seeds': 'Corriander seed',
+    'Cucumber': 'Cucumbar(Kheera)',
+    'Cumin (Jeera)': 'Cummin Seed(Jeera)',
+    'Fennel (Saunf)': 'Soanf',
+    'Fenugreek (Methi)': 'Methi(Leaves)',
+    'Jackfruit': 'Jack Fruit',
+    'Lady Finger (Bhindi)': 'Bhindi(Ladies Finger)',
+    'Lobia (Cowpea)': 'Cowpea (Lobia/Karamani)',
+    'Masoor (Lentil)': 'Lentil (Masur)(Whole)',
+    'Moong (Green Gram)': 'Green Gram (Moong)(Whole)',
+    'Moong(green gram)': 'Green Gram (Moong)(Whole)',
+    'Mustard Seeds': 'Mustard',
+    'Rapeseed & Mustard': 'Mustard',
+    'Niger (Ramtil)': 'Niger Seed (Ramtil)',
+    'Radish': 'Raddish',
+    'Sesame (Til)': 'Sesamum(Sesame,Gingelly,Til)',
+    'Soybean': 'Soyabean',
+    'Urad': 'Black Gram (Urd Beans)(Whole)',
+    'Urad (Black Gram)': 'Black Gram (Urd Beans)(Whole)',
+    'Watermelon': 'Water Melon',
+    'Maize (For Fodder)': None,  # fodder isn't sold at the grain price
+}
+
+
+def _build_commodity_join() -> np.ndarray:
+    # Price commodity code for each yield commodity code (-1 when there is no price)
+    price_commodities = price_vocabularies["commodity"]
+    by_base_name = {}
+    for i, name in enumerate(price_commodities.names):
+        by_base_name.setdefault(normalize_name(name.split("(")[0]), i)
+
+    join = np.full(len(commoditiess), -1, dtype=np.int64)
+    for i, name in enumerate(commoditiess):
+        if name in yield_to_price_commodity_names:
+            price_name = yield_to_price_commodity_names[name]
+            code = None if price_name is None else price_commodities.lookup(price_name)
+        else:
+            code = price_commodities.lookup(name)
+            if code is None:
+                code = by_base_name.get(normalize_name(name.split("(")[0]))
+        if code is not None:
+            join[i] = code
+    return join
+
+
+yield_to_price_commodity = _build_commodity_join()
+
 
 # Define a Pydantic model to accept the input data from the user
 class YieldEstimationRequest(BaseModel):
-    state: str
-    district: str
-    commodity: str
-    season: str
-    area_hectare: float  # Area in hectares
+    state: CategoryValue
+    district: CategoryValue
+    commodity: CategoryValue
+    season: CategoryValue
+    area_hectare: float = Field(..., gt=0)  # Area in hectares
 
 # Replace with your Gemini API URL and API Key
 
@@ -114,58 +872,192 @@ class YieldEstimationRequest(BaseModel):
 class UserMessage(BaseModel):
     query: str
 
-# Initialize the Gemini client
-client = genai.Client(api_key="Your Gemini API key Here")
+# Initialize the Gemini client on first use (google.genai is slow to import and only the chatbot needs it)
+client = None
+client_lock = threading.Lock()
+
+
+def get_client():
+    global client
+    with client_lock:
+        if client is None:
+            from google import genai
+            client = genai.Client(api_key="Your Gemini API key Here")
+    return client
+
+
+async def aget_client():
+    # The first call imports google.genai (~0.7 s), so it runs on a worker thread, not the event loop
+    if client is not None:
+        return client
+    return await asyncio.to_thread(get_client)
+
+# Gemini calls are limited per worker and answers are cached by normalized query text
+GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", 8))
+GEMINI_TIMEOUT_S = float(os.environ.get("GEMINI_TIMEOUT_S", 20))
+CHAT_CACHE_SIZE = int(os.environ.get("CHAT_CACHE_SIZE", 1024))
+CHAT_CACHE_TTL_S = float(os.environ.get("CHAT_CACHE_TTL_S", 3600))
+
+
+chat_cache = TTLCache(CHAT_CACHE_SIZE, CHAT_CACHE_TTL_S)
+gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+
+def normalize_query(user_query: str) -> str:
+    # "Best fertilizer for  Soybean?" and "best fertilizer for soybean" share a cache entry
+    return " ".join(user_query.lower().split()).rstrip("?.! ")
+
+# Markdown -> HTML in one pass over the text. Works line by line, so it can be fed Gemini's
+# streamed chunks and emit every completed line as soon as its newline arrives.
+section_header_pattern = re.compile(r'\s*([A-Za-z][A-Za-z ]*):')
+inline_tags = {3: ("<h3>", "</h3>"), 2: ("<strong>", "</strong>"), 1: ("<em>", "</em>")}
+
+
+def format_inline(line: str) -> str:
+    # ***text*** -> <h3>, **text** -> <strong>, *text* -> <em>; unpaired markers stay as typed
+    if "*" not in line:
+        return line
+    parts = []
+    opened = {}  # marker length -> index of its placeholder in parts
+    position = 0
+    while True:
+        start = line.find("*", position)
+        if start == -1:
+            parts.append(line[position:])
+            break
+        parts.append(line[position:start])
+        end = start
+        while end < len(line) and line[end] == "*":
+            end += 1
+        marker = end - start
+        if marker in opened:
+            parts[opened.pop(marker)] = inline_tags[marker][0]
+            parts.append(inline_tags[marker][1])
+        else:
+            if marker in inline_tags:
+                opened[marker] = len(parts)
+            parts.append(line[start:end])
+        position = end
+    return "".join(parts)
+
+
+class ResponseFormatter:
+    def __init__(self):
+        self._pending = []  # pieces of the line still waiting for its newline
+        self._blank_lines = 0
+        self._previous = None  # "text", "header" or "list"
+
+    def feed(self, chunk: str) -> str:
+        html = []
+        position = 0
+        while True:
+            newline = chunk.find("\n", position)
+            if newline == -1:
+                break
+            self._pending.append(chunk[position:newline])
+            html.append(self._line("".join(self._pending)))
+            self._pending = []
+            position = newline + 1
+        if position < len(chunk):
+            self._pending.append(chunk[position:])
+        return "".join(html)
+
+    def close(self) -> str:
+        html = self._line("".join(self._pending))
+        self._pending = []
+        html += self._flush_blank_lines("text")
+        if self._previous == "list":
+            html += "</ul>"
+        self._previous = None
+        return html
+
+    def _line(self, line: str) -> str:
+        stripped = line.lstrip()
+        header = section_header_pattern.match(line)
+        if stripped.startswith(("- ", "* ")):
+            kind, body = "list", f"<li>{format_inline(stripped[2:])}</li>"
+        elif header:
+            kind, body = "header", f"<h4>{header.group(1)}:</h4>{format_inline(line[header.end():])}"
+        elif not stripped:
+            # Held back: blank lines before a header or list item are dropped
+            self._blank_lines += 1
+            return ""
+        else:
+            kind, body = "text", format_inline(line)
+        return self._flush_blank_lines(kind) + self._open(kind) + body
+
+    def _flush_blank_lines(self, kind: str) -> str:
+        blank_lines, self._blank_lines = self._blank_lines, 0
+        if kind != "text":
+            return ""
+        return "".join(self._open("text") for _ in range(blank_lines))
+
+    def _open(self, kind: str) -> str:
+        # Consecutive list items share one <ul>; text lines are separated by <br>
+        html = ""
+        if self._previous == "list" and kind != "list":
+            html = "</ul>"
+        elif kind == "list" and self._previous != "list":
+            html = "<ul>"
+        elif kind == "text" and self._previous in ("text", "header"):
+            html = "<br>"
+        self._previous = kind
+        return html
+
 
-# Function to interact with Gemini API using genai client
 def formatResponse(responseText: str) -> str:
-    # Replace ***text*** with <h3>text</h3> (for headings)
-    formattedResponse = re.sub(r'\*\*\*(.*?)\*\*\*', r'<h3>\1</h3>', responseText)
-    
-    # Replace **text** with <strong>text</strong> (for bold text)
-    formattedResponse = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', formattedResponse)
-    
-    # Replace *text* with <em>text</em> (for italic text)
-    formattedResponse = re.sub(r'\*(.*?)\*', r'<em>\1</em>', formattedResponse)
-    
-    # Replace section headers (e.g., "Crops:") with <h4>Crops:</h4>
-    formattedResponse = re.sub(r'(^|\n)\s*([A-Za-z\s]+):', r'<h4>\2:</h4>', formattedResponse)
-    
-    # Replace bullet points (- item) with <li>item</li>
-    formattedResponse = re.sub(r'\n- (.*?)(?=\n|$)', r'<li>\1</li>', formattedResponse)
-    
-    # Replace newlines with <br> for line breaks
-    formattedResponse = re.sub(r'\n', r'<br>', formattedResponse)
-    
-    # Wrap bullet points in a <ul> tag if any <li> tags are present
-    if '<li>' in formattedResponse:
-        formattedResponse = re.sub(r'(<li>.*?</li>)', r'<ul>\1</ul>', formattedResponse)
-    
-    return formattedResponse
+    formatter = ResponseFormatter()
+    return formatter.feed(responseText) + formatter.close()
+
+
 # Function to interact with the Gemini API using genai client
-def get_gemini_response(user_query: str) -> str:
-    try:
-        # Prepare the content to ask for agriculture-related responses in bullet points
-        prompt = f"Provide short, concise, and straightforward answers related to agriculture in bullet points. Answer the query: {user_query}"
+def build_prompt(user_query: str) -> str:
+    # Ask for agriculture-related responses in bullet points (shared by /query/ and /query/stream/)
+    return f"Provide short, concise, and straightforward answers related to agriculture in bullet points. Answer the query: {user_query}"
 
-        # Call the Gemini model to generate content based on agriculture-related queries
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",  # Specify your model
+
+async def _generate_content(prompt: str):
+    # Waits for a free slot, then calls the async client so the event loop keeps serving
+    async with gemini_semaphore:
+        return await (await aget_client()).aio.models.generate_content(
+            model=GEMINI_MODEL,  # Specify your model
             contents=prompt,  # Send the agriculture-related prompt
         )
 
-        # Check if the response has text
-        if response.text:
-            # Format the response text before returning it
-            formatted_response = formatResponse(response.text)
-            return formatted_response
-        
-        return "Sorry, I could not find an answer."
-    
+
+async def get_gemini_response(user_query: str) -> str:
+    with stage("cache"):
+        cache_key = normalize_query(user_query)
+        cached_response = chat_cache.get(cache_key)
+    if cached_response is not None:
+        return cached_response
+
+    try:
+        prompt = build_prompt(user_query)
+
+        # Call the Gemini model to generate content based on agriculture-related queries
+        with stage("gemini"):
+            response = await asyncio.wait_for(_generate_content(prompt), timeout=GEMINI_TIMEOUT_S)
+
+    except asyncio.TimeoutError:
+        metrics.inc("gemini_errors_total", (("reason", "timeout"),))
+        raise HTTPException(status_code=504, detail="Gemini API timed out")
     except Exception as e:
         # Handle exceptions (e.g., API errors, connection issues)
+        metrics.inc("gemini_errors_total", (("reason", "error"),))
         raise HTTPException(status_code=500, detail=f"Error querying Gemini API: {str(e)}")
 
+    # Check if the response has text
+    if response.text:
+        # Format the response text before returning it
+        with stage("format"):
+            formatted_response = formatResponse(response.text)
+        chat_cache.set(cache_key, formatted_response)
+        return formatted_response
+
+    return "Sorry, I could not find an answer."
+
 # Route to handle user queries
 
 
@@ -176,27 +1068,26 @@ def home():
 
 # Crop Prediction Route
 @app.post("/predict/")
-def predict(input_data: CropPredictionInput):
-    if crop_model is None:
+async def predict(input_data: CropPredictionInput, top_k: Optional[int] = Query(None, ge=1, le=len(crop_labels))):
+    handler_started()
+    if await model_registry.aget("crop") is None:
         raise HTTPException(status_code=500, detail="Model is not loaded.")
 
+    # Feature row in the model's column order
+    with stage("features"):
+        row = [getattr(input_data, field) for field in crop_feature_columns]
+
     try:
-        # Convert input data to DataFrame
-        data = pd.DataFrame([input_data.dict().values()], columns=["N", "P", "K", "temperature", "humidity", "pH", "rainfall"])
-
-        # Make prediction
-        predicted_label = crop_model.predict(data)[0]
-        reverse_crop_mapping = {
-            0: 'aloevera', 1: 'blackpepper', 2: 'chilli', 3: 'garlic', 4: 'ginger', 5: 'groundnut', 6: 'onion',
-            7: 'potato', 8: 'soybean', 9: 'sugarcane', 10: 'sunflower', 11: 'tea', 12: 'tobacco', 13: 'tomato',
-            14: 'turmeric', 15: 'wheat', 16: 'apple', 17: 'banana', 18: 'blackgram', 19: 'chickpea', 20: 'coconut',
-            21: 'coffee', 22: 'cotton', 23: 'grapes', 24: 'jute', 25: 'kidneybeans', 26: 'lentil', 27: 'maize',
-            28: 'mango', 29: 'mothbeans', 30: 'mungbean', 31: 'muskmelon', 32: 'orange', 33: 'papaya', 34: 'pigeonpeas',
-            35: 'pomegranate', 36: 'rice', 37: 'watermelon'
-        }
-        predicted_crop = reverse_crop_mapping.get(predicted_label, "Unknown Crop")
+        # Make prediction (batched with concurrent requests, see MicroBatcher)
+        if top_k is None:
+            with stage("model"):
+                predicted_crop = await crop_batcher.predict(row)
+            return {"predicted_crop": predicted_crop}
 
-        return {"predicted_crop": predicted_crop}
+        with stage("model"):
+            probabilities, classes = await crop_proba_batcher.predict(row)
+            ranked = crop_engine.top_k(probabilities, classes, top_k)
+        return {"predicted_crop": ranked[0]["crop"], "top_k": ranked}
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Prediction error: {str(e)}")
@@ -204,27 +1095,26 @@ def predict(input_data: CropPredictionInput):
 # Price Estimation Route
 @app.post("/predict-price/")
 async def estimate_price(request: PriceEstimationRequest):
-    if price_model is None:
+    handler_started()
+    if await model_registry.aget("price") is None:
         raise HTTPException(status_code=500, detail="Model is not loaded.")
 
-    # Prepare the input data for prediction
-    input_features = np.array([[request.district, request.month - 1, request.market, request.commodity,
-        request.variety, request.agri_season, request.climate_season]])
+    # Resolve names/indexes to model codes (400 on anything unknown)
+    with stage("features"):
+        input_features = [vocabulary.encode(getattr(request, column)) for column, vocabulary in price_vocabularies.items()]
 
     try:
-        # Predict price using the model
-        predicted_price = price_model.predict(input_features)[0]
+        # Predict price using the model (cached per model version, batched with concurrent requests)
+        with stage("cache"):
+            cache_key = (model_registry.version("price"), *input_features)
+            predicted_price = price_cache.get(cache_key)
+        if predicted_price is None:
+            with stage("model"):
+                predicted_price = await price_batcher.predict(input_features)
+            price_cache.set(cache_key, predicted_price)
 
-        result = {
-            "district": districts[request.district],
-            "month": months[request.month - 1],
-            "market": markets[request.market],
-            "commodity": commodities[request.commodity],
-            "variety": varieties[request.variety],
-            "agri_season": agri_seasons[request.agri_season],
-            "climate_season": climate_seasons[request.climate_season],
-            "predicted_price": predicted_price
-        }
+        result = {column: vocabulary.names[code] for (column, vocabulary), code in zip(price_vocabularies.items(), input_features)}
+        result["predicted_price"] = predicted_price
 
         return JSONResponse(content=result)
 
@@ -234,39 +1124,26 @@ async def estimate_price(request: PriceEstimationRequest):
 
 @app.post("/predict-yield/")
 async def estimate_yield(request: YieldEstimationRequest):
+    handler_started()
     # Check if model is loaded
-    if yield_model is None:
+    if await model_registry.aget("yield") is None:
         raise HTTPException(status_code=500, detail="Model is not loaded.")
     
-    # Validate inputs
-    if request.state not in statess:
-        raise HTTPException(status_code=400, detail="Invalid state")
-    if request.district not in Districtss:
-        raise HTTPException(status_code=400, detail="Invalid district")
-    if request.commodity not in commoditiess:
-        raise HTTPException(status_code=400, detail="Invalid commodity")
-    if request.season not in seasonss:
-        raise HTTPException(status_code=400, detail="Invalid season")
-    
-    # Prepare the input features for prediction
-    input_features = np.array([[
-        statess.index(request.state), 
-        Districtss.index(request.district), 
-        commoditiess.index(request.commodity), 
-        seasonss.index(request.season), 
-        request.area_hectare
-    ]])
+    # Validate inputs and resolve names/indexes to model codes
+    with stage("features"):
+        codes = {column: vocabulary.encode(getattr(request, column)) for column, vocabulary in yield_vocabularies.items()}
+
+        # Prepare the input features for prediction
+        input_features = [*codes.values(), request.area_hectare]
 
     try:
-        # Predict yield using the model (In ton/ha) - Replace this with your actual model prediction logic
-        predicted_yield = np.random.random()  # Simulated prediction, replace with actual model prediction
+        # Predict yield using the model (In ton/ha), batched with concurrent requests
+        with stage("model"):
+            predicted_yield = float(await yield_batcher.predict(input_features))
 
         # Construct the result to return to the frontend
         result = {
-            "state": request.state,
-            "district": request.district,
-            "commodity": request.commodity,
-            "season": request.season,
+            **{column: yield_vocabularies[column].names[code] for column, code in codes.items()},
             "area_hectare": request.area_hectare,
             "predicted_yield_ton_ha": predicted_yield  # Returning predicted yield in ton/ha
         }
@@ -279,13 +1156,516 @@ async def estimate_yield(request: YieldEstimationRequest):
     
 @app.post("/query/")
 async def query_chatbot(user_message: UserMessage):
+    handler_started()
     user_query = user_message.query
     
-    # Get response from Gemini API
-    response = get_gemini_response(user_query)
+    # Get response from Gemini API (or the answer cache)
+    response = await get_gemini_response(user_query)
     return {"response": response}
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _open_content_stream(prompt: str):
+    # Takes a Gemini slot and opens the stream; the caller releases the slot when the stream ends
+    await gemini_semaphore.acquire()
+    try:
+        return await (await aget_client()).aio.models.generate_content_stream(model=GEMINI_MODEL, contents=prompt)
+    except BaseException:
+        gemini_semaphore.release()
+        raise
+
+
+async def stream_gemini_response(user_query: str):
+    # Server-sent events: one "html" event per batch of completed lines, then "done" (or "error")
+    with stage("cache"):
+        cache_key = normalize_query(user_query)
+        cached_response = chat_cache.get(cache_key)
+    if cached_response is not None:
+        yield _sse("html", {"html": cached_response})
+        yield _sse("done", {"cached": True})
+        return
+
+    formatter = ResponseFormatter()
+    formatted = []
+    chunks = None
+    try:
+        # Waiting for a slot and opening the stream share one timeout, as in /query/
+        with stage("gemini"):
+            chunks = await asyncio.wait_for(_open_content_stream(build_prompt(user_query)), timeout=GEMINI_TIMEOUT_S)
+        while True:
+            # The timeout applies to each chunk, so a stalled stream is cut off
+            try:
+                with stage("gemini"):
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=GEMINI_TIMEOUT_S)
+            except StopAsyncIteration:
+                break
+            if not chunk.text:
+                continue
+            with stage("format"):
+                html = formatter.feed(chunk.text)
+            if html:
+                formatted.append(html)
+                yield _sse("html", {"html": html})
+    except asyncio.TimeoutError:
+        metrics.inc("gemini_errors_total", (("reason", "timeout"),))
+        yield _sse("error", {"detail": "Gemini API timed out"})
+        return
+    except Exception as e:
+        metrics.inc("gemini_errors_total", (("reason", "error"),))
+        yield _sse("error", {"detail": f"Error querying Gemini API: {str(e)}"})
+        return
+    finally:
+        # Also runs on timeouts, errors and client disconnects: close the upstream stream, free the slot
+        if chunks is not None:
+            try:
+                await chunks.aclose()
+            finally:
+                gemini_semaphore.release()
+
+    html = formatter.close()
+    if html:
+        formatted.append(html)
+        yield _sse("html", {"html": html})
+    if formatted:
+        chat_cache.set(cache_key, "".join(formatted))
+    else:
+        yield _sse("html", {"html": "Sorry, I could not find an answer."})
+    yield _sse("done", {"cached": False})
+
+
+@app.post("/query/stream/")
+async def query_chatbot_stream(user_message: UserMessage):
+    handler_started()
+    return StreamingResponse(
+        stream_gemini_response(user_message.query),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/query/cache/")
+def chatbot_cache_stats():
+    return chat_cache.stats()
+
+
+# ----------------------------- PRICE SURFACES -----------------------------
+# The price input space is purely categorical, so single lookups are cached and whole
+# surfaces (e.g. every month for a commodity/market) come from one vectorized predict.
+# Cache keys include the model version, so a reloaded model never serves stale prices.
+
+PRICE_CACHE_SIZE = int(os.environ.get("PRICE_CACHE_SIZE", 100000))
+PRICE_SURFACE_CACHE_SIZE = int(os.environ.get("PRICE_SURFACE_CACHE_SIZE", 512))
+PRICE_SURFACE_MAX_CELLS = int(os.environ.get("PRICE_SURFACE_MAX_CELLS", 50000))
+
+price_cache = TTLCache(PRICE_CACHE_SIZE, float("inf"))
+price_surface_cache = TTLCache(PRICE_SURFACE_CACHE_SIZE, float("inf"))
+
+
+class PriceSurfaceRequest(BaseModel):
+    # Fields listed in `vary` are swept over every value; all others must be given
+    vary: List[str]
+    district: Optional[CategoryValue] = None
+    month: Optional[CategoryValue] = None
+    market: Optional[CategoryValue] = None
+    commodity: Optional[CategoryValue] = None
+    variety: Optional[CategoryValue] = None
+    agri_season: Optional[CategoryValue] = None
+    climate_season: Optional[CategoryValue] = None
+
+
+def _compute_price_surface(price_model, fixed: dict, vary: tuple) -> np.ndarray:
+    axes = np.meshgrid(*[np.arange(len(price_vocabularies[column])) for column in vary], indexing="ij")
+    features = np.empty((axes[0].size, len(price_vocabularies)), dtype=np.int64)
+    for j, column in enumerate(price_vocabularies):
+        features[:, j] = axes[vary.index(column)].ravel() if column in vary else fixed[column]
+    return np.asarray(price_model.predict(features), dtype=np.float32).reshape(axes[0].shape)
+
+
+async def _cached_price_surface(price_model, fixed: dict, vary: tuple) -> np.ndarray:
+    cache_key = (model_registry.version("price"), vary, tuple(fixed.items()))
+    surface = price_surface_cache.get(cache_key)
+    if surface is None:
+        surface = await asyncio.to_thread(_compute_price_surface, price_model, fixed, vary)
+        price_surface_cache.set(cache_key, surface)
+    return surface
+
+
+@app.post("/predict-price/surface/")
+async def estimate_price_surface(request: PriceSurfaceRequest):
+    handler_started()
+    price_model = await model_registry.aget("price")
+    if price_model is None:
+        raise HTTPException(status_code=500, detail="Model is not loaded.")
+
+    vary = tuple(request.vary)
+    unknown = [column for column in vary if column not in price_vocabularies]
+    if not vary or unknown or len(set(vary)) != len(vary):
+        raise HTTPException(status_code=400, detail=f"vary must list distinct fields from: {', '.join(price_vocabularies)}")
+    if np.prod([len(price_vocabularies[column]) for column in vary]) > PRICE_SURFACE_MAX_CELLS:
+        raise HTTPException(status_code=400, detail=f"Surface larger than {PRICE_SURFACE_MAX_CELLS} cells")
+
+    # Fixed fields accept names or indexes, like /predict-price/
+    fixed = {}
+    for column, vocabulary in price_vocabularies.items():
+        if column in vary:
+            continue
+        value = getattr(request, column)
+        if value is None:
+            raise HTTPException(status_code=400, detail=f"Missing field: {column}")
+        fixed[column] = vocabulary.encode(value)
+
+    try:
+        with stage("model"):
+            surface = await _cached_price_surface(price_model, fixed, vary)
+    except Exception as e:
+        record_model_error("price")
+        raise HTTPException(status_code=400, detail=f"Prediction error: {str(e)}")
+
+    best = np.unravel_index(int(np.argmax(surface)), surface.shape)
+    return {
+        "fixed": {column: price_vocabularies[column].names[code] for column, code in fixed.items()},
+        "axes": {column: price_vocabularies[column].names for column in vary},
+        "prices": surface.tolist(),
+        "best": {
+            **{column: price_vocabularies[column].names[i] for column, i in zip(vary, best)},
+            "predicted_price": float(surface[best]),
+        },
+    }
+
+
+# ----------------------------- CROP RANKING -----------------------------
+# Scores every yield commodity for a piece of land in one predict call and, when market
+# details are given, joins the price model's output to rank crops by expected revenue.
+
+YIELD_RANKING_CACHE_SIZE = int(os.environ.get("YIELD_RANKING_CACHE_SIZE", 1024))
+
+yield_ranking_cache = TTLCache(YIELD_RANKING_CACHE_SIZE, float("inf"))
+
+
+class PriceContext(BaseModel):
+    # Where and when the crop would be sold; commodity is filled in per crop
+    district: CategoryValue
+    month: CategoryValue
+    market: CategoryValue
+    variety: CategoryValue
+    agri_season: CategoryValue
+    climate_season: CategoryValue
+
+
+class CropRankingRequest(BaseModel):
+    state: CategoryValue
+    district: CategoryValue
+    season: CategoryValue
+    area_hectare: float = Field(..., gt=0)  # a zero or negative area would flip or flatten the revenue order
+    price: Optional[PriceContext] = None
+    limit: Optional[int] = Field(None, ge=1)
+
+
+def _compute_yield_ranking(yield_model, state: int, district: int, season: int, area_hectare: float) -> np.ndarray:
+    features = np.empty((len(commoditiess), 5), dtype=float)
+    features[:, 0] = state
+    features[:, 1] = district
+    features[:, 2] = np.arange(len(commoditiess))
+    features[:, 3] = season
+    features[:, 4] = area_hectare
+    return np.asarray(yield_model.predict(features), dtype=np.float32)
+
+
+@app.post("/predict-yield/ranking/")
+async def rank_crops(request: CropRankingRequest):
+    handler_started()
+    yield_model = await model_registry.aget("yield")
+    if yield_model is None:
+        raise HTTPException(status_code=500, detail="Model is not loaded.")
+
+    state = yield_vocabularies["state"].encode(request.state)
+    district = yield_vocabularies["district"].encode(request.district)
+    season = yield_vocabularies["season"].encode(request.season)
+
+    # area_hectare is a model feature, so it is part of the key along with district and season
+    cache_key = (model_registry.version("yield"), state, district, season, request.area_hectare)
+    yields = yield_ranking_cache.get(cache_key)
+    if yields is None:
+        try:
+            with stage("model"):
+                yields = await asyncio.to_thread(_compute_yield_ranking, yield_model, state, district, season, request.area_hectare)
+        except Exception as e:
+            record_model_error("yield")
+            raise HTTPException(status_code=400, detail=f"Prediction error: {str(e)}")
+        yield_ranking_cache.set(cache_key, yields)
+
+    prices = None
+    if request.price is not None:
+        price_model = await model_registry.aget("price")
+        if price_model is None:
+            raise HTTPException(status_code=500, detail="Model is not loaded.")
+
+        fixed = {
+            column: vocabulary.encode(getattr(request.price, column))
+            for column, vocabulary in price_vocabularies.items()
+            if column != "commodity"
+        }
+        try:
+            # Every price commodity in one call (shared with /predict-price/surface/)
+            with stage("model"):
+                price_surface = await _cached_price_surface(price_model, fixed, ("commodity",))
+        except Exception as e:
+            record_model_error("price")
+            raise HTTPException(status_code=400, detail=f"Prediction error: {str(e)}")
+        has_price = yield_to_price_commodity >= 0
+        prices = np.where(has_price, price_surface[np.maximum(yield_to_price_commodity, 0)], np.nan)
+
+    production = yields.astype(float) * request.area_hectare
+    revenue = production * prices if prices is not None else None
+
+    # Highest revenue first (crops without a price last), or highest yield without prices
+    if revenue is not None:
+        order = np.lexsort((-production, -np.nan_to_num(revenue, nan=-np.inf)))
+    else:
+        order = np.argsort(-yields, kind="stable")
+    if request.limit is not None:
+        order = order[:request.limit]
+
+    ranking = []
+    for i in order:
+        entry = {
+            "commodity": commoditiess[i],
+            "predicted_yield_ton_ha": float(yields[i]),
+            "expected_production_ton": float(production[i]),
+        }
+        if revenue is not None:
+            has_revenue = not np.isnan(revenue[i])
+            entry["predicted_price"] = float(prices[i]) if has_revenue else None
+            entry["expected_revenue"] = float(revenue[i]) if has_revenue else None
+        ranking.append(entry)
+
+    return {
+        "state": yield_vocabularies["state"].names[state],
+        "district": yield_vocabularies["district"].names[district],
+        "season": yield_vocabularies["season"].names[season],
+        "area_hectare": request.area_hectare,
+        "ranked_by": "expected_revenue" if revenue is not None else "predicted_yield_ton_ha",
+        "ranking": ranking,
+    }
+
+
+# ----------------------------- BULK SCORING -----------------------------
+# CSV uploads are read in fixed-size chunks; each chunk is scored with one vectorized
+# predict call and streamed back before the next one is read, so memory stays bounded.
+
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", 5000))
+bulk_media_types = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def _read_csv_chunks(upload: UploadFile, required_columns):
+    # Read the first chunk eagerly so a bad file is a 400 before streaming starts
+    try:
+        with stage("read_csv"):
+            # Every column is read as text so the echoed input has one type across chunks;
+            # the scorers parse the columns they need
+            reader = pd.read_csv(upload.file, chunksize=BULK_CHUNK_SIZE, dtype=str, keep_default_na=False)
+            first_chunk = next(reader, None)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read CSV: {str(e)}")
+    if first_chunk is None or first_chunk.empty:  # empty chunk: a header without rows
+        raise HTTPException(status_code=400, detail="CSV file has no rows")
+
+    missing = [column for column in required_columns if column not in first_chunk.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing columns: {', '.join(missing)}")
+
+    return itertools.chain([first_chunk], reader)
+
+
+def _bulk_error_record(message: str, columns, output_format: str) -> str:
+    # Last record of a stream that failed part-way: an NDJSON {"error": ...} line, or a CSV row
+    # with only the error column set (plus the header if nothing was written yet)
+    if output_format == "ndjson":
+        return json.dumps({"error": message}) + "\n"
+    return pd.DataFrame([{"error": message}], columns=columns or ["error"]).to_csv(index=False, header=columns is None)
+
+
+def _stream_scored_chunks(chunks, score_chunk, output_format: str):
+    columns = None  # set once the CSV header has been written
+    rows = 0
+    while True:
+        try:
+            with stage("read_csv"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            with stage("model"):
+                scored = score_chunk(chunk.reset_index(drop=True))
+        except Exception as e:
+            # The 200 status is already sent, so end the body with an error record rather than truncating it
+            yield _bulk_error_record(f"Stopped after {rows} rows: {str(e).strip()}", columns, output_format)
+            return
+        with stage("encode_output"):
+            if output_format == "ndjson":
+                data = scored.to_json(orient="records", lines=True).rstrip("\n") + "\n"
+            else:
+                data = scored.to_csv(index=False, header=columns is None)
+        columns = list(scored.columns)
+        rows += len(scored)
+        yield data
+
+
+def _bulk_response(file: UploadFile, required_columns, score_chunk, output_format: str):
+    if output_format not in bulk_media_types:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {output_format}")
+
+    chunks = _read_csv_chunks(file, required_columns)
+    return StreamingResponse(
+        _stream_scored_chunks(chunks, score_chunk, output_format),
+        media_type=bulk_media_types[output_format],
+    )
+
+
+def _score_crop_chunk(crop_model, chunk: pd.DataFrame) -> pd.DataFrame:
+    features = chunk[list(crop_feature_columns)].apply(pd.to_numeric, errors="coerce")
+    valid = features.notna().all(axis=1)
+    for column, (low, high) in crop_input_bounds.items():
+        valid &= features[column].between(low, high)
+
+    chunk["predicted_crop"] = None
+    chunk["error"] = np.where(valid, "", "Invalid or out-of-range input")
+    if valid.any():
+        try:
+            chunk.loc[valid, "predicted_crop"] = crop_engine.predict(crop_model, features.loc[valid].to_numpy(np.float32))
+        except Exception as e:
+            record_model_error("crop")
+            chunk.loc[valid, "error"] = f"Prediction error: {str(e)}"
+    return chunk
+
+
+def _score_price_chunk(price_model, chunk: pd.DataFrame) -> pd.DataFrame:
+    features = pd.DataFrame({column: vocabulary.encode_column(chunk[column]) for column, vocabulary in price_vocabularies.items()})
+    valid = features.notna().all(axis=1)
+
+    chunk["predicted_price"] = np.nan
+    chunk["error"] = np.where(valid, "", "Unknown name or index")
+    if valid.any():
+        try:
+            chunk.loc[valid, "predicted_price"] = price_model.predict(features.loc[valid].to_numpy(dtype=np.int64))
+        except Exception as e:
+            record_model_error("price")
+            chunk.loc[valid, "error"] = f"Prediction error: {str(e)}"
+    return chunk
+
+
+def _score_yield_chunk(yield_model, chunk: pd.DataFrame) -> pd.DataFrame:
+    features = pd.DataFrame({column: vocabulary.encode_column(chunk[column]) for column, vocabulary in yield_vocabularies.items()})
+    features["area_hectare"] = pd.to_numeric(chunk["area_hectare"], errors="coerce")
+    valid = features.notna().all(axis=1) & (features["area_hectare"] > 0) & np.isfinite(features["area_hectare"])
+
+    chunk["predicted_yield_ton_ha"] = np.nan
+    chunk["error"] = np.where(valid, "", "Unknown name or index, or invalid area")
+    if valid.any():
+        try:
+            chunk.loc[valid, "predicted_yield_ton_ha"] = yield_model.predict(features.loc[valid].to_numpy(dtype=float))
+        except Exception as e:
+            record_model_error("yield")
+            chunk.loc[valid, "error"] = f"Prediction error: {str(e)}"
+    return chunk
+
+
+@app.post("/predict/bulk/")
+def predict_bulk(file: UploadFile = File(...), output_format: str = Query("csv", alias="format")):
+    handler_started()
+    # The model is pinned for the whole file, even if a reload happens mid-stream
+    crop_model = model_registry.get("crop")
+    if crop_model is None:
+        raise HTTPException(status_code=500, detail="Model is not loaded.")
+    return _bulk_response(file, list(crop_input_bounds), functools.partial(_score_crop_chunk, crop_model), output_format)
+
+
+@app.post("/predict-price/bulk/")
+def estimate_price_bulk(file: UploadFile = File(...), output_format: str = Query("csv", alias="format")):
+    handler_started()
+    # The model is pinned for the whole file, even if a reload happens mid-stream
+    price_model = model_registry.get("price")
+    if price_model is None:
+        raise HTTPException(status_code=500, detail="Model is not loaded.")
+    return _bulk_response(file, list(price_vocabularies), functools.partial(_score_price_chunk, price_model), output_format)
+
+
+@app.post("/predict-yield/bulk/")
+def estimate_yield_bulk(file: UploadFile = File(...), output_format: str = Query("csv", alias="format")):
+    handler_started()
+    # The model is pinned for the whole file, even if a reload happens mid-stream
+    yield_model = model_registry.get("yield")
+    if yield_model is None:
+        raise HTTPException(status_code=500, detail="Model is not loaded.")
+    return _bulk_response(file, list(yield_vocabularies) + ["area_hectare"], functools.partial(_score_yield_chunk, yield_model), output_format)
+
+
+# ----------------------------- METRICS -----------------------------
+def _render_state_metrics() -> str:
+    # Gauges read at scrape time from the caches and the model registry
+    lines = ["# TYPE cache_hits_total counter", "# TYPE cache_misses_total counter", "# TYPE cache_entries gauge"]
+    caches = {"chat": chat_cache, "price": price_cache, "price_surface": price_surface_cache, "yield_ranking": yield_ranking_cache}
+    for name, cache in caches.items():
+        stats = cache.stats()
+        labels = _format_labels((("cache", name),))
+        lines += [f"cache_hits_total{labels} {stats['hits']}", f"cache_misses_total{labels} {stats['misses']}",
+                  f"cache_entries{labels} {stats['size']}"]
+
+    lines += ["# TYPE model_loaded gauge", "# TYPE model_version gauge", "# TYPE model_load_seconds gauge"]
+    for name, stats in model_registry.stats().items():
+        labels = _format_labels((("model", name),))
+        lines += [f"model_loaded{labels} {int(stats['loaded'])}", f"model_version{labels} {stats['version']}"]
+        if stats["load_time_s"] is not None:
+            lines.append(f"model_load_seconds{labels} {stats['load_time_s']}")
+    return "\n".join(lines) + "\n"
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render() + _render_state_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/profiles/{profile_id}")
+def request_profile(profile_id: str):
+    # Collapsed stacks of a request sent with ?profile=1 (needs PROFILING_ENABLED=1)
+    if profile_id not in recent_profiles:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    return PlainTextResponse(recent_profiles[profile_id])
+
+
+# ----------------------------- MODEL ADMIN -----------------------------
+# Forced reloads need MODEL_ADMIN_TOKEN (sent as "Authorization: Bearer <token>"); without it
+# the route is disabled and the file watcher alone picks up new models. A reload only
+# affects the worker that serves the request.
+MODEL_ADMIN_TOKEN = os.environ.get("MODEL_ADMIN_TOKEN", "")
+
+
+def require_admin_token(authorization: Optional[str] = Header(None)):
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {MODEL_ADMIN_TOKEN}"
+    if authorization is None or not hmac.compare_digest(authorization.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.get("/models/")
+def model_stats():
+    return model_registry.stats()
+
+
+@app.post("/models/{name}/reload", dependencies=[Depends(require_admin_token)])
+def reload_model(name: str):
+    if name not in model_registry.models:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {name}")
+
+    model_registry.reload(name)
+    model = model_registry.models[name]
+    if model.error is not None:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {model.error}")
+    return model.stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8080))
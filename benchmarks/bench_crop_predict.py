@@ -0,0 +1,64 @@
+# Compares the old one-row DataFrame crop path with CropInferenceEngine on a synthetic model.
+# Run from the repo root: python benchmarks/bench_crop_predict.py [iterations] [n_estimators]
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+
+def build_model(n_estimators):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.random((2000, 7)) * 100, columns=app.crop_model_columns)
+    y = rng.integers(0, len(app.crop_labels), len(X))
+    return RandomForestClassifier(n_estimators=n_estimators, random_state=0).fit(X, y)
+
+
+def dataframe_path(model, input_data):
+    # The /predict/ handler body before the engine: a one-row DataFrame per call
+    data = pd.DataFrame([[getattr(input_data, field) for field in app.crop_feature_columns]], columns=app.crop_model_columns)
+    predicted_label = model.predict(data)[0]
+    reverse_crop_mapping = dict(enumerate(app.crop_labels))
+    return reverse_crop_mapping.get(predicted_label, "Unknown Crop")
+
+
+def engine_path(model, input_data):
+    row = [getattr(input_data, field) for field in app.crop_feature_columns]
+    return app.crop_engine.predict(model, [row])[0]
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6, np.percentile(samples, 95) * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n_estimators = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    model = build_model(n_estimators)
+    input_data = app.CropPredictionInput(nitrogen=90, phosphorus=42, potassium=43, ph=6.5,
+                                         humidity=80.5, rainfall=200.0, temperature=23.0)
+    assert dataframe_path(model, input_data) == engine_path(model, input_data)
+
+    results = {
+        "dataframe": timed(lambda: dataframe_path(model, input_data), iterations),
+        "engine": timed(lambda: engine_path(model, input_data), iterations),
+    }
+    for name, (p50, p95) in results.items():
+        print(f"{name:>10}: p50 {p50:8.1f} us   p95 {p95:8.1f} us")
+    saved = results["dataframe"][0] - results["engine"][0]
+    print(f"saved per call (p50): {saved:.1f} us, speedup {results['dataframe'][0] / results['engine'][0]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Offline stand-ins for the production models and the Gemini client, so the benchmarks
+# run without the real .pkl files or network access.
+import asyncio
+import os
+import types
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+# Long enough to exercise every formatResponse rule on a realistic answer
+FAKE_ANSWER = (
+    "***Soybean fertilizer***\n"
+    "Nutrients:\n"
+    "- **Nitrogen**: 20-25 kg/ha at sowing\n"
+    "- **Phosphorus**: 60-80 kg/ha as *SSP* or *DAP*\n"
+    "- **Potassium**: 20-40 kg/ha as MOP\n"
+    "Tips:\n"
+    "- Apply *Rhizobium* seed treatment\n"
+    "- Add sulphur on deficient soils"
+)
+
+
+def write_models(model_dir: str, crop_labels: int, price_cardinalities, yield_cardinalities, seed: int = 0):
+    # Small random forests with the same input shapes as the real models
+    rng = np.random.default_rng(seed)
+    n = 2000
+    os.makedirs(model_dir, exist_ok=True)
+
+    crop_X = pd.DataFrame(rng.random((n, 7)) * 100, columns=["N", "P", "K", "temperature", "humidity", "pH", "rainfall"])
+    crop_model = RandomForestClassifier(n_estimators=20, random_state=seed).fit(crop_X, rng.integers(0, crop_labels, n))
+    joblib.dump(crop_model, os.path.join(model_dir, "Crop_prediction.pkl"))
+
+    price_X = np.column_stack([rng.integers(0, size, n) for size in price_cardinalities])
+    price_model = RandomForestRegressor(n_estimators=20, random_state=seed).fit(price_X, rng.random(n) * 5000)
+    joblib.dump(price_model, os.path.join(model_dir, "crop_price_model.pkl"))
+
+    yield_X = np.column_stack([rng.integers(0, size, n) for size in yield_cardinalities] + [rng.random(n) * 10])
+    yield_model = RandomForestRegressor(n_estimators=20, random_state=seed).fit(yield_X, rng.random(n) * 5)
+    joblib.dump(yield_model, os.path.join(model_dir, "yield_prediction_model.pkl"))
+
+
+class FakeGeminiModels:
+    def __init__(self, delay_s: float = 0.0, text: str = FAKE_ANSWER):
+        self.delay_s = delay_s
+        self.text = text
+        self.calls = 0
+
+    async def generate_content(self, model, contents):
+        self.calls += 1
+        await asyncio.sleep(self.delay_s)
+        return types.SimpleNamespace(text=self.text)
+
+    async def generate_content_stream(self, model, contents, chunk_size: int = 24):
+        # Same answer in small pieces, with the delay spread across them like token streaming
+        self.calls += 1
+        pieces = [self.text[i:i + chunk_size] for i in range(0, len(self.text), chunk_size)]
+
+        async def chunks():
+            for piece in pieces:
+                await asyncio.sleep(self.delay_s / len(pieces))
+                yield types.SimpleNamespace(text=piece)
+
+        return chunks()
+
+
+def fake_gemini_client(delay_s: float = 0.0):
+    # Mirrors the client.aio.models shape used by app.get_gemini_response and app.stream_gemini_response
+    return types.SimpleNamespace(aio=types.SimpleNamespace(models=FakeGeminiModels(delay_s)))
@@ -0,0 +1,236 @@
+# Offline latency/throughput benchmarks for every route, driven through the ASGI app with
+# synthetic stand-in models and a fake Gemini client. Results go to a JSON file so runs
+# can be compared over time.
+#
+# Run from the repo root:
+#   python benchmarks/run.py --requests 500 --concurrency 32
+#   python benchmarks/run.py --compare benchmarks/results-20261018T120000Z.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+from benchmarks import fakes  # noqa: E402
+
+CROP_BODY = {"nitrogen": 90, "phosphorus": 42, "potassium": 43, "ph": 6.5,
+             "humidity": 80.5, "rainfall": 200.0, "temperature": 23.0}
+
+
+def summarize(latencies, wall_s: float, errors: int = 0) -> dict:
+    # Latencies in seconds -> milliseconds percentiles plus throughput
+    ms = np.array(latencies) * 1000
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+        "requests_per_s": len(latencies) / wall_s if wall_s > 0 else None,
+    }
+
+
+# ----------------------------- ROUTES -----------------------------
+# Each route builds request i from a seeded generator so runs are reproducible
+
+def route_requests(rng: np.random.Generator, bulk_rows: int) -> dict:
+    yield_district = app.yield_vocabularies["district"]
+
+    def price_body(i):
+        body = {field: int(rng.integers(len(vocabulary))) for field, vocabulary in app.price_vocabularies.items()}
+        body["month"] += 1  # 1-based like the real clients
+        return body
+
+    crop_csv = pd.DataFrame([CROP_BODY] * bulk_rows).to_csv(index=False)
+
+    return {
+        "predict": lambda c, i: c.post("/predict/", json=CROP_BODY),
+        "predict_top_k": lambda c, i: c.post("/predict/?top_k=3", json=CROP_BODY),
+        "estimate_price": lambda c, i: c.post("/predict-price/", json=price_body(i)),
+        "estimate_price_surface": lambda c, i: c.post("/predict-price/surface/", json={
+            **{field: value for field, value in price_body(i).items() if field != "month"}, "vary": ["month"]}),
+        "estimate_yield": lambda c, i: c.post("/predict-yield/", json={
+            "state": "Maharashtra", "district": yield_district.names[i % len(yield_district)],
+            "commodity": app.commoditiess[i % len(app.commoditiess)], "season": "Kharif", "area_hectare": 2.5}),
+        "rank_crops": lambda c, i: c.post("/predict-yield/ranking/", json={
+            "state": "Maharashtra", "district": yield_district.names[i % len(yield_district)], "season": "Rabi",
+            "area_hectare": 2.5, "limit": 10,
+            "price": {"district": "Pune", "month": "October", "market": "Pune", "variety": "Local",
+                      "agri_season": "Rabi", "climate_season": "Winter"}}),
+        # Unique queries measure the upstream path; repeated ones measure the answer cache
+        "query_chatbot": lambda c, i: c.post("/query/", json={"query": f"best fertilizer for soybean #{i}"}),
+        "query_chatbot_cached": lambda c, i: c.post("/query/", json={"query": "best fertilizer for soybean"}),
+        "query_chatbot_stream": lambda c, i: c.post("/query/stream/", json={"query": f"best manure for wheat #{i}"}),
+        "predict_bulk": lambda c, i: c.post("/predict/bulk/", files={"file": ("rows.csv", crop_csv)}),
+    }
+
+
+async def run_route(client: httpx.AsyncClient, make_request, total: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    await make_request(client, 0)  # warm-up: lazy model load, first batch
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+async def run_routes(args, selected) -> dict:
+    rng = np.random.default_rng(args.seed)
+    requests = route_requests(rng, args.bulk_rows)
+    results = {}
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, make_request in requests.items():
+            if selected and name not in selected:
+                continue
+            # Bulk requests are thousands of rows each, so fewer of them
+            total = max(1, args.requests // 20) if name == "predict_bulk" else args.requests
+            results[name] = await run_route(client, make_request, total, args.concurrency)
+            print(f"{name:>24}: p50 {results[name]['p50_ms']:8.2f} ms  p99 {results[name]['p99_ms']:8.2f} ms"
+                  f"  {results[name]['requests_per_s']:9.1f} req/s  errors {results[name]['errors']}")
+    return results
+
+
+# ----------------------------- MICROBENCHMARKS -----------------------------
+
+def time_calls(fn, iterations: int) -> dict:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    us = np.array(samples) * 1e6
+    return {
+        "iterations": iterations,
+        "p50_us": float(np.percentile(us, 50)),
+        "p95_us": float(np.percentile(us, 95)),
+        "p99_us": float(np.percentile(us, 99)),
+        "ops_per_s": iterations / sum(samples),
+    }
+
+
+def run_micro(args) -> dict:
+    row = [CROP_BODY[field] for field in app.crop_feature_columns]
+    price_names = {"district": "Pune", "month": "October", "market": "Pune", "commodity": "Soyabean",
+                   "variety": "Local", "agri_season": "Kharif", "climate_season": "Monsoon"}
+    market_column = pd.Series(np.resize(app.markets, 10000))
+    small_answer = fakes.FAKE_ANSWER
+    large_answer = "\n".join([fakes.FAKE_ANSWER] * 500)
+
+    cases = {
+        "crop_features_dataframe": (lambda: pd.DataFrame([row], columns=app.crop_model_columns), args.micro_iterations),
+        "crop_features_engine": (lambda: app.crop_engine.features([row]), args.micro_iterations),
+        "price_features_encode": (lambda: [vocabulary.encode(price_names[field])
+                                           for field, vocabulary in app.price_vocabularies.items()], args.micro_iterations),
+        "market_column_encode_10k": (lambda: app.price_vocabularies["market"].encode_column(market_column), 50),
+        "format_response_small": (lambda: app.formatResponse(small_answer), args.micro_iterations),
+        "format_response_large": (lambda: app.formatResponse(large_answer), 20),
+    }
+    results = {}
+    for name, (fn, iterations) in cases.items():
+        results[name] = time_calls(fn, iterations)
+        print(f"{name:>24}: p50 {results[name]['p50_us']:10.1f} us  p99 {results[name]['p99_us']:10.1f} us")
+    return results
+
+
+# ----------------------------- REPORTING -----------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path: str, current: dict):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nChange in p50 against {previous_path}:")
+    for section, key in (("routes", "p50_ms"), ("micro", "p50_us")):
+        for name, result in current.get(section, {}).items():
+            before = previous.get(section, {}).get(name)
+            if before:
+                change = (result[key] - before[key]) / before[key] * 100
+                print(f"{name:>24}: {before[key]:10.2f} -> {result[key]:10.2f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Agrosarthi API benchmarks")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=16, help="in-flight requests per route")
+    parser.add_argument("--routes", default="", help="comma-separated route names (default: all)")
+    parser.add_argument("--bulk-rows", type=int, default=2000, help="rows per bulk CSV upload")
+    parser.add_argument("--micro-iterations", type=int, default=1000)
+    parser.add_argument("--gemini-delay-ms", type=float, default=0.0, help="simulated Gemini latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--output", default=None, help="results file (default: benchmarks/results-<time>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    # Synthetic models in a temp dir, registered in place of the real files
+    model_dir = tempfile.mkdtemp(prefix="agrosarthi-bench-")
+    fakes.write_models(
+        model_dir,
+        crop_labels=len(app.crop_labels),
+        price_cardinalities=[len(vocabulary) for vocabulary in app.price_vocabularies.values()],
+        yield_cardinalities=[len(vocabulary) for vocabulary in app.yield_vocabularies.values()],
+        seed=args.seed,
+    )
+    for name, filename in (("crop", "Crop_prediction.pkl"), ("price", "crop_price_model.pkl"),
+                           ("yield", "yield_prediction_model.pkl")):
+        app.model_registry.register(name, os.path.join(model_dir, filename))
+    app.MODEL_WATCH_INTERVAL_S = 0
+    app.client = fakes.fake_gemini_client(args.gemini_delay_ms / 1000)
+
+    selected = {name.strip() for name in args.routes.split(",") if name.strip()}
+    started_at = datetime.now(timezone.utc)
+    results = {
+        "meta": {
+            "started_at": started_at.isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "routes": asyncio.run(run_routes(args, selected)),
+        "micro": {} if args.skip_micro else run_micro(args),
+    }
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                         f"results-{started_at.strftime('%Y%m%dT%H%M%SZ')}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
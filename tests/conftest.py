@@ -0,0 +1,57 @@
+# Tests import app.py and the benchmark fakes from the repo root
+import asyncio
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from benchmarks import fakes  # noqa: E402
+
+
+class CountingGeminiModels(fakes.FakeGeminiModels):
+    # Records the most upstream calls that were in flight at once
+    def __init__(self, delay_s: float = 0.0):
+        super().__init__(delay_s)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_content(self, model, contents):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await super().generate_content(model, contents)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    models = CountingGeminiModels()
+    monkeypatch.setattr(app, "client", types.SimpleNamespace(aio=types.SimpleNamespace(models=models)))
+    # A fresh semaphore per test: each asyncio.run() in a test has its own event loop
+    monkeypatch.setattr(app, "gemini_semaphore", asyncio.Semaphore(app.GEMINI_MAX_CONCURRENCY))
+    app.chat_cache.clear()
+    yield models
+    app.chat_cache.clear()
+
+
+@pytest.fixture(scope="session")
+def fake_models(tmp_path_factory):
+    # Small synthetic models with the real input shapes, registered in place of the .pkl files
+    model_dir = str(tmp_path_factory.mktemp("models"))
+    fakes.write_models(
+        model_dir,
+        crop_labels=len(app.crop_labels),
+        price_cardinalities=[len(vocabulary) for vocabulary in app.price_vocabularies.values()],
+        yield_cardinalities=[len(vocabulary) for vocabulary in app.yield_vocabularies.values()],
+    )
+    original = dict(app.model_registry.models)
+    for name, filename in (("crop", "Crop_prediction.pkl"), ("price", "crop_price_model.pkl"),
+                           ("yield", "yield_prediction_model.pkl")):
+        app.model_registry.register(name, os.path.join(model_dir, filename))
+    yield app.model_registry
+    app.model_registry.models = original
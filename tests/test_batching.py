@@ -0,0 +1,87 @@
+# MicroBatcher: grouping, per-caller results, per-row retries and cancelled callers
+import asyncio
+
+import app
+
+
+class RecordingPredictor:
+    # predict_batch stand-in: row -> row * 10, raises on any "bad" row, remembers every batch
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, rows):
+        self.batches.append(list(rows))
+        if "bad" in rows:
+            raise ValueError("bad row")
+        return [row * 10 for row in rows]
+
+
+def test_concurrent_callers_share_one_call_and_get_their_own_result():
+    predictor = RecordingPredictor()
+
+    async def main():
+        batcher = app.MicroBatcher(predictor, max_batch_size=64, max_wait_ms=5, name="test")
+        return await asyncio.gather(*(batcher.predict(i) for i in range(5)))
+
+    assert asyncio.run(main()) == [0, 10, 20, 30, 40]
+    assert predictor.batches == [[0, 1, 2, 3, 4]]
+
+
+def test_full_batches_flush_without_waiting():
+    predictor = RecordingPredictor()
+
+    async def main():
+        batcher = app.MicroBatcher(predictor, max_batch_size=2, max_wait_ms=1000, name="test")
+        return await asyncio.wait_for(asyncio.gather(*(batcher.predict(i) for i in range(4))), timeout=0.5)
+
+    assert asyncio.run(main()) == [0, 10, 20, 30]
+    assert predictor.batches == [[0, 1], [2, 3]]
+
+
+def test_failed_batch_is_retried_row_by_row():
+    predictor = RecordingPredictor()
+
+    async def main():
+        batcher = app.MicroBatcher(predictor, max_batch_size=64, max_wait_ms=5, name="batching-test")
+        return await asyncio.gather(*(batcher.predict(row) for row in (1, "bad", 3)), return_exceptions=True)
+
+    first, bad, third = asyncio.run(main())
+
+    assert (first, third) == (10, 30)
+    assert isinstance(bad, ValueError)
+    assert predictor.batches[0] == [1, "bad", 3]
+    assert sorted(map(str, predictor.batches[1:])) == ["['bad']", "[1]", "[3]"]
+    # Only the row that still fails on its own counts as a model error
+    assert 'model_errors_total{model="batching-test"} 1' in app.metrics.render()
+
+
+def test_cancelled_callers_are_skipped():
+    predictor = RecordingPredictor()
+
+    batch_outcomes = []
+
+    async def main():
+        batcher = app.MicroBatcher(predictor, max_batch_size=64, max_wait_ms=20, name="test")
+        run = batcher._run
+
+        async def tracked_run(batch):
+            # A set_result on the cancelled caller's future would fail the batch task here
+            try:
+                await run(batch)
+            except BaseException as e:
+                batch_outcomes.append(e)
+                raise
+            batch_outcomes.append("ok")
+
+        batcher._run = tracked_run
+        tasks = [asyncio.ensure_future(batcher.predict(i)) for i in range(3)]
+        await asyncio.sleep(0)  # every row is queued
+        tasks[1].cancel()
+        return await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=1)
+
+    first, cancelled, third = asyncio.run(main())
+
+    assert (first, third) == (0, 20)
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert predictor.batches == [[0, 1, 2]]
+    assert batch_outcomes == ["ok"]
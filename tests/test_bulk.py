@@ -0,0 +1,105 @@
+# CSV bulk-scoring endpoints against synthetic models
+import asyncio
+import io
+import json
+
+import httpx
+import pandas as pd
+import pytest
+
+import app
+
+CROP_HEADER = "nitrogen,phosphorus,potassium,ph,humidity,rainfall,temperature\n"
+CROP_ROW = "90,42,43,6.5,80.5,200,23\n"
+
+
+def post_file(path: str, content: str, output_format: str = None):
+    async def main():
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            params = {"format": output_format} if output_format else None
+            return await client.post(path, params=params, files={"file": ("rows.csv", content)})
+    return asyncio.run(main())
+
+
+def read_ndjson(text: str):
+    return [json.loads(line) for line in text.splitlines()]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch, fake_models):
+    monkeypatch.setattr(app, "BULK_CHUNK_SIZE", 2)
+
+
+def test_crop_bulk_streams_every_chunk_with_one_header(small_chunks):
+    rows = [CROP_ROW, "abc,42,43,6.5,80.5,200,23\n", CROP_ROW, "90,42,43,6.5,80.5,999,23\n", CROP_ROW]
+    response = post_file("/predict/bulk/", CROP_HEADER + "".join(rows))
+
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/csv")
+    assert response.text.count("nitrogen,") == 1
+    result = pd.read_csv(io.StringIO(response.text), keep_default_na=False)
+    assert len(result) == 5
+    assert list(result["error"]) == ["", "Invalid or out-of-range input", "", "Invalid or out-of-range input", ""]
+
+    single = app.crop_engine.predict(app.model_registry.get("crop"), [[90, 42, 43, 23, 80.5, 6.5, 200]])[0]
+    assert list(result["predicted_crop"]) == [single, "", single, "", single]
+
+
+def test_ndjson_echoes_input_as_text_across_chunks(small_chunks):
+    content = CROP_HEADER + CROP_ROW + CROP_ROW + "abc,42,43,6.5,80.5,200,23\n" + CROP_ROW
+    response = post_file("/predict/bulk/", content, "ndjson")
+
+    records = read_ndjson(response.text)
+    assert [record["nitrogen"] for record in records] == ["90", "90", "abc", "90"]
+    assert [record["error"] == "" for record in records] == [True, True, False, True]
+
+
+@pytest.mark.parametrize("output_format", ["csv", "ndjson"])
+def test_malformed_row_in_a_later_chunk_ends_with_an_error_record(small_chunks, output_format):
+    content = CROP_HEADER + CROP_ROW * 3 + "1,2,3,4,5,6,7,8,9\n" + CROP_ROW
+    response = post_file("/predict/bulk/", content, output_format)
+
+    assert response.status_code == 200
+    if output_format == "ndjson":
+        *records, last = read_ndjson(response.text)
+        assert len(records) == 2
+        assert set(last) == {"error"}
+    else:
+        result = pd.read_csv(io.StringIO(response.text), keep_default_na=False)
+        records, last = result.iloc[:-1], result.iloc[-1]
+        assert len(records) == 2
+        assert last["nitrogen"] == "" and last["predicted_crop"] == ""
+        last = last.to_dict()
+    assert last["error"].startswith("Stopped after 2 rows:")
+    assert "Expected 7 fields" in last["error"]
+
+
+def test_price_bulk_marks_unknown_names(fake_models):
+    content = ("district,month,market,commodity,variety,agri_season,climate_season\n"
+               "Pune,10,Pune,Soyabean,Local,Kharif,Monsoon\n"
+               "Pune,October,Atlantis,Soyabean,Local,Kharif,Monsoon\n")
+    records = read_ndjson(post_file("/predict-price/bulk/", content, "ndjson").text)
+
+    assert records[0]["error"] == "" and records[0]["predicted_price"] > 0
+    assert records[1]["error"] == "Unknown name or index" and records[1]["predicted_price"] is None
+
+
+def test_yield_bulk_rejects_non_positive_area(fake_models):
+    content = ("state,district,commodity,season,area_hectare\n"
+               "Maharashtra,Pune,Rice,Rabi,2.5\n"
+               "Maharashtra,Pune,Rice,Rabi,-5\n"
+               "Maharashtra,Pune,Rice,Rabi,0\n")
+    records = read_ndjson(post_file("/predict-yield/bulk/", content, "ndjson").text)
+
+    assert [record["error"] == "" for record in records] == [True, False, False]
+    assert records[0]["predicted_yield_ton_ha"] is not None
+
+
+@pytest.mark.parametrize("content, output_format, detail", [
+    ("nitrogen,phosphorus\n1,2\n", None, "Missing columns: potassium, ph, humidity, rainfall, temperature"),
+    (CROP_HEADER, None, "CSV file has no rows"),
+    (CROP_HEADER + CROP_ROW, "xml", "Unsupported format: xml"),
+])
+def test_bad_uploads_are_rejected_before_streaming(fake_models, content, output_format, detail):
+    response = post_file("/predict/bulk/", content, output_format)
+    assert (response.status_code, response.json()["detail"]) == (400, detail)
@@ -0,0 +1,54 @@
+# /query/ against a local fake Gemini client: no network, no API key
+import asyncio
+
+import httpx
+
+import app
+from benchmarks import fakes
+
+
+async def post_queries(*queries):
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.post("/query/", json={"query": query}) for query in queries))
+
+
+def test_cache_hit_skips_upstream(gemini):
+    first, = asyncio.run(post_queries("best fertilizer for soybean"))
+    second, = asyncio.run(post_queries("best fertilizer for soybean"))
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json() == {"response": app.formatResponse(fakes.FAKE_ANSWER)}
+    assert gemini.calls == 1
+
+
+def test_normalize_query_merges_equivalent_queries(gemini):
+    queries = ["Best fertilizer for  Soybean?", "best fertilizer for soybean", "  BEST fertilizer for soybean!"]
+    assert len({app.normalize_query(query) for query in queries}) == 1
+
+    for query in queries:
+        response, = asyncio.run(post_queries(query))
+        assert response.status_code == 200
+    assert gemini.calls == 1
+
+
+def test_upstream_timeout_returns_504(gemini, monkeypatch):
+    gemini.delay_s = 1.0
+    monkeypatch.setattr(app, "GEMINI_TIMEOUT_S", 0.05)
+
+    response, = asyncio.run(post_queries("slow question"))
+
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Gemini API timed out"}
+    assert app.chat_cache.get(app.normalize_query("slow question")) is None
+
+
+def test_semaphore_limits_concurrent_upstream_calls(gemini, monkeypatch):
+    gemini.delay_s = 0.05
+    monkeypatch.setattr(app, "gemini_semaphore", asyncio.Semaphore(2))
+
+    responses = asyncio.run(post_queries(*(f"question {i}" for i in range(6))))
+
+    assert [response.status_code for response in responses] == [200] * 6
+    assert gemini.calls == 6
+    assert gemini.max_in_flight == 2
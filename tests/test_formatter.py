@@ -0,0 +1,147 @@
+# ResponseFormatter / formatResponse and the /query/stream/ server-sent events
+import asyncio
+import json
+import types
+
+import httpx
+import pytest
+
+import app
+from benchmarks import fakes
+
+
+def format_in_chunks(text: str, cuts) -> str:
+    formatter = app.ResponseFormatter()
+    bounds = [0, *cuts, len(text)]
+    return "".join(formatter.feed(text[start:end]) for start, end in zip(bounds, bounds[1:])) + formatter.close()
+
+
+def test_consecutive_bullets_share_one_list():
+    assert app.formatResponse("Crops:\n- rice\n- wheat\n- maize") == \
+        "<h4>Crops:</h4><ul><li>rice</li><li>wheat</li><li>maize</li></ul>"
+
+
+def test_star_bullets_and_first_line_bullet():
+    assert app.formatResponse("* rice\n* **wheat**") == "<ul><li>rice</li><li><strong>wheat</strong></li></ul>"
+
+
+def test_header_after_list_closes_the_list():
+    assert app.formatResponse("- rice\nTips:\n- water early") == \
+        "<ul><li>rice</li></ul><h4>Tips:</h4><ul><li>water early</li></ul>"
+
+
+def test_separate_lists_and_text_lines():
+    assert app.formatResponse("Intro text.\n\nCrops:\n- a\n- b\n\nDone.") == \
+        "Intro text.<h4>Crops:</h4><ul><li>a</li><li>b</li></ul><br>Done."
+    assert app.formatResponse("a\n\nb\n") == "a<br><br>b<br>"
+
+
+def test_inline_markers():
+    assert app.formatResponse("***Title*** with **bold** and *em*") == \
+        "<h3>Title</h3> with <strong>bold</strong> and <em>em</em>"
+    assert app.formatResponse("an unpaired * star") == "an unpaired * star"
+
+
+@pytest.mark.parametrize("text", [fakes.FAKE_ANSWER, "Intro text.\n\nCrops:\n- a\n- b\n\nDone.\n", "*a **b** c*\n\n\n"])
+def test_chunked_output_matches_whole_text_at_every_split_point(text):
+    whole = app.formatResponse(text)
+    for cut in range(len(text) + 1):
+        assert format_in_chunks(text, [cut]) == whole, cut
+    assert format_in_chunks(text, range(1, len(text))) == whole  # one character at a time
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+async def stream_query(query: str):
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/query/stream/", json={"query": query})
+    return response.status_code, response.headers["content-type"], parse_events(response.text)
+
+
+def test_stream_events_match_formatted_answer_and_fill_cache(gemini):
+    status, content_type, events = asyncio.run(stream_query("best fertilizer for soybean"))
+
+    assert status == 200 and content_type.startswith("text/event-stream")
+    assert [event for event, _ in events[:-1]] == ["html"] * (len(events) - 1)
+    assert len(events) > 2  # streamed in several pieces, not one
+    assert events[-1] == ("done", {"cached": False})
+    html = "".join(data["html"] for _, data in events[:-1])
+    assert html == app.formatResponse(fakes.FAKE_ANSWER)
+    assert app.chat_cache.get(app.normalize_query("best fertilizer for soybean")) == html
+
+    _, _, cached_events = asyncio.run(stream_query("Best fertilizer for soybean?"))
+    assert cached_events == [("html", {"html": html}), ("done", {"cached": True})]
+    assert gemini.calls == 1
+
+
+class StubStream:
+    # Plays back items: text becomes a chunk, a number is a stall (seconds), an exception is raised.
+    # A plain object, so only an explicit aclose() (not garbage collection) marks it closed.
+    def __init__(self, *items):
+        self.items = list(items)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.items:
+            raise StopAsyncIteration
+        item = self.items.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        if isinstance(item, (int, float)):
+            await asyncio.sleep(item)
+        return types.SimpleNamespace(text=item)
+
+    async def aclose(self):
+        self.closed = True
+
+
+def serve_stream(gemini, monkeypatch, stream):
+    async def generate_content_stream(model, contents):
+        return stream
+
+    monkeypatch.setattr(gemini, "generate_content_stream", generate_content_stream)
+    monkeypatch.setattr(app, "gemini_semaphore", asyncio.Semaphore(1))  # locked() afterwards means the slot leaked
+
+
+def test_stream_timeout_closes_upstream_and_frees_the_slot(gemini, monkeypatch):
+    stream = StubStream("- first line\n", 10)
+    serve_stream(gemini, monkeypatch, stream)
+    monkeypatch.setattr(app, "GEMINI_TIMEOUT_S", 0.05)
+
+    _, _, events = asyncio.run(stream_query("slow question"))
+
+    assert events == [("html", {"html": "<ul><li>first line</li>"}), ("error", {"detail": "Gemini API timed out"})]
+    assert stream.closed
+    assert not app.gemini_semaphore.locked()
+    assert app.chat_cache.get(app.normalize_query("slow question")) is None
+
+
+def test_stream_error_closes_upstream_and_frees_the_slot(gemini, monkeypatch):
+    stream = StubStream("- first line\n", RuntimeError("connection reset"), "- never sent\n")
+    serve_stream(gemini, monkeypatch, stream)
+
+    _, _, events = asyncio.run(stream_query("flaky question"))
+
+    assert events[-1] == ("error", {"detail": "Error querying Gemini API: connection reset"})
+    assert stream.closed
+    assert not app.gemini_semaphore.locked()
+
+
+def test_stream_slot_wait_is_bounded_by_the_timeout(gemini, monkeypatch):
+    monkeypatch.setattr(app, "gemini_semaphore", asyncio.Semaphore(0))  # no free slot
+    monkeypatch.setattr(app, "GEMINI_TIMEOUT_S", 0.05)
+
+    _, _, events = asyncio.run(stream_query("queued question"))
+
+    assert events == [("error", {"detail": "Gemini API timed out"})]
+    assert gemini.calls == 0
@@ -0,0 +1,72 @@
+# Vocabulary: name/alias/index lookups and column encoding
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+import app
+
+
+def test_exact_names_win_over_aliases():
+    vocabulary = app.Vocabulary("district", ["Pune", "Latur", "latur"])
+
+    # Both spellings keep their own code; other spellings resolve to the first one
+    assert vocabulary.lookup("Latur") == 1
+    assert vocabulary.lookup("latur") == 2
+    assert vocabulary.lookup("  LATUR ") == 1
+    assert vocabulary.lookup(" pune ") == 0
+
+
+def test_real_yield_districts_keep_both_latur_codes():
+    districts = app.yield_vocabularies["district"]
+    assert districts.lookup("Latur") == districts.names.index("Latur")
+    assert districts.lookup("latur") == districts.names.index("latur")
+
+
+def test_months_are_one_based():
+    months = app.price_vocabularies["month"]
+    assert months.lookup(1) == months.lookup("January") == 0
+    assert months.lookup(12) == months.lookup("December") == 11
+    assert months.lookup(0) is None
+    assert months.lookup(13) is None
+
+
+def test_numeric_strings_and_integer_floats_are_indexes():
+    vocabulary = app.Vocabulary("market", ["A", "B", "C"])
+    assert vocabulary.lookup("2") == 2
+    assert vocabulary.lookup(" 1 ") == 1
+    assert vocabulary.lookup(2.0) == 2
+    assert vocabulary.lookup(np.int64(1)) == 1
+    assert vocabulary.lookup("-1") is None
+    assert vocabulary.lookup(1.5) is None
+    assert vocabulary.lookup("3") is None
+
+
+def test_numeric_names_win_over_indexes():
+    vocabulary = app.Vocabulary("variety", ["0", "5"])
+    assert vocabulary.lookup("5") == 1  # the name "5", not index 5
+    assert vocabulary.lookup(1) == 1
+
+
+@pytest.mark.parametrize("value", [True, False, np.bool_(True)])
+def test_booleans_are_rejected(value):
+    vocabulary = app.Vocabulary("month", ["January", "February"], first_index=1)
+    assert vocabulary.lookup(value) is None
+    with pytest.raises(HTTPException) as error:
+        vocabulary.encode(value)
+    assert error.value.status_code == 400
+
+
+def test_encode_reports_the_field_and_value():
+    with pytest.raises(HTTPException) as error:
+        app.price_vocabularies["market"].encode("Atlantis")
+    assert (error.value.status_code, error.value.detail) == (400, "Invalid market: 'Atlantis'")
+
+
+def test_encode_column_matches_lookup_and_marks_unknown_and_missing_as_nan():
+    vocabulary = app.Vocabulary("district", ["Pune", "Latur", "latur"])
+    column = pd.Series(["Pune", "latur", " LATUR ", "2", "Atlantis", None, np.nan, "", "Pune"])
+
+    codes = vocabulary.encode_column(column)
+
+    np.testing.assert_array_equal(codes, [0, 2, 1, 2, np.nan, np.nan, np.nan, np.nan, 0])